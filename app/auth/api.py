@@ -4,9 +4,11 @@ from fastapi import APIRouter, BackgroundTasks, Body, Depends, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.auth import models, oauth2, schemas
-from app.auth.deps import get_current_user
+from app.auth.deps import get_current_user, vary_by_user
 from app.auth.emails import send_password_reset_email, send_verification_email
 from app.auth.exceptions import AuthException
+from app.core import translation
+from app.core.cache import CacheInvalidator, cache_route
 from app.utils import security
 
 router = APIRouter()
@@ -26,7 +28,8 @@ async def register(
         full_name=user_in.full_name,
     )
     tokens = await security.create_auth_tokens(user.id)
-    background_tasks.add_task(send_verification_email, user)
+    # background tasks run after the response, pin the request's language
+    background_tasks.add_task(send_verification_email, user, translation.get_language())
     return tokens
 
 
@@ -48,6 +51,7 @@ async def refresh(refresh_token: str = Body(embed=True)) -> schemas.AccessToken:
 
 
 @router.get("/me")
+@cache_route(vary=[vary_by_user])
 async def me_read(user: models.User = Depends(get_current_user)) -> schemas.UserRead:
     return schemas.UserRead.from_orm(user)
 
@@ -63,12 +67,14 @@ async def me_update(
 
     user.update_from_dict(user_in.dict(exclude_unset=True))
     await user.save()
+    await CacheInvalidator.invalidate(vary_by_user.tag_for(user.id))
     return schemas.UserRead.from_orm(user)
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def me_delete(user: models.User = Depends(get_current_user)) -> None:
     await user.delete()
+    await CacheInvalidator.invalidate(vary_by_user.tag_for(user.id))
 
 
 @router.post("/forgot-password", status_code=status.HTTP_202_ACCEPTED)
@@ -102,6 +108,7 @@ async def verify(token: str = Body(embed=True)) -> None:
     if user and not user.is_verified:
         user.update_from_dict({"is_verified": True})
         await user.save()
+        await CacheInvalidator.invalidate(vary_by_user.tag_for(user.id))
 
 
 @router.get("/google/authorize")
@@ -1,8 +1,11 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError
 
 from app.auth import models
 from app.auth.exceptions import AuthException
+from app.core import timing
+from app.core.cache import Vary
 from app.core.config import settings
 from app.utils import security
 
@@ -16,6 +19,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> models.User:
         raise AuthException.user_not_found
     if not user.is_active:
         raise AuthException.user_is_inactive
+    if user.is_superuser:
+        timing.expose()
     return user
 
 
@@ -25,3 +30,18 @@ async def get_current_superuser(
     if not current_user.is_superuser:
         raise AuthException.user_not_superuser
     return current_user
+
+
+def get_token_user_id(request: Request) -> str | None:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return str(security.verify_access_token(token))
+    except (AuthException, JWTError):
+        return None
+
+
+vary_by_user = Vary(
+    "user", get_token_user_id, header="Authorization", tag=True, private=True
+)
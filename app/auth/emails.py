@@ -1,17 +1,15 @@
-from gettext import gettext as _
-
 from app.auth import models
 from app.core.config import settings
+from app.core.translation import gettext_lazy as _
 from app.utils import security
 from app.utils.emails import EmailSender
 
 
-def send_password_reset_email(user: models.User) -> None:
+def send_password_reset_email(user: models.User, lang: str | None = None) -> None:
     token = security.create_password_reset_token(user.id)
     url = settings.CLIENT_URL + f"/reset-password?token={token}"
     subject = _("Password Reset")
     context = {
-        "lang": "en",
         "subject": subject,
         "title": subject,
         "heading": "",
@@ -19,15 +17,14 @@ def send_password_reset_email(user: models.User) -> None:
         "url": url,
     }
 
-    EmailSender.send_html_email([user.email], subject, "password-reset", context)
+    EmailSender.send_html_email([user.email], subject, "password-reset", context, lang)
 
 
-def send_verification_email(user: models.User) -> None:
+def send_verification_email(user: models.User, lang: str | None = None) -> None:
     token = security.create_email_verification_token(user.email)
     url = settings.CLIENT_URL + f"/verify-email?token={token}"
     subject = _("Email Verification")
     context = {
-        "lang": "en",
         "subject": subject,
         "title": subject,
         "heading": "",
@@ -35,4 +32,6 @@ def send_verification_email(user: models.User) -> None:
         "url": url,
     }
 
-    EmailSender.send_html_email([user.email], subject, "email-verification", context)
+    EmailSender.send_html_email(
+        [user.email], subject, "email-verification", context, lang
+    )
@@ -1,7 +1,7 @@
 from enum import Enum
 
 from app.core.exceptions import ApiException
-from app.core.translation import gettext as _
+from app.core.translation import gettext_lazy as _
 
 
 class AuthException(ApiException, Enum):
@@ -2,9 +2,8 @@ from abc import ABC, abstractmethod
 from typing import Any
 from urllib.parse import unquote, urlencode
 
-import aiohttp
-
 from app.auth.oauth2.exceptions import OAuth2Exception
+from app.core.logs import client_session
 
 
 class BaseOAuth2(ABC):
@@ -61,7 +60,7 @@ class BaseOAuth2(ABC):
         if code_verifier:
             data.update({"code_verifier": code_verifier})
 
-        async with aiohttp.ClientSession() as session:
+        async with client_session() as session:
             async with session.post(
                 cls.access_token_endpoint, data=data, headers=cls.request_headers
             ) as response:
@@ -84,7 +83,7 @@ class BaseOAuth2(ABC):
             },
         )
 
-        async with aiohttp.ClientSession() as session:
+        async with client_session() as session:
             async with session.post(
                 cls.refresh_token_endpoint, data=data, headers=cls.request_headers
             ) as response:
@@ -103,7 +102,7 @@ class BaseOAuth2(ABC):
         if token_type_hint is not None:
             data["token_type_hint"] = token_type_hint
 
-        async with aiohttp.ClientSession() as session:
+        async with client_session() as session:
             async with session.post(
                 cls.revoke_token_endpoint, data=data, headers=cls.request_headers
             ) as response:
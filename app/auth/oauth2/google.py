@@ -1,10 +1,9 @@
 from typing import Any
 
-import aiohttp
-
 from app.auth.oauth2.base import BaseOAuth2
 from app.auth.oauth2.exceptions import OAuth2Exception
 from app.core.config import settings
+from app.core.logs import client_session
 
 
 class GoogleOAuth2(BaseOAuth2):
@@ -22,7 +21,7 @@ class GoogleOAuth2(BaseOAuth2):
 
     @classmethod
     async def get_id_email(cls, token: str) -> tuple[str, str | None]:
-        async with aiohttp.ClientSession() as session:
+        async with client_session() as session:
             async with session.get(
                 "https://people.googleapis.com/v1/people/me",
                 params={"personFields": "emailAddresses"},
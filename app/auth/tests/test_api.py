@@ -8,6 +8,7 @@ from app.auth import models
 from app.auth.exceptions import AuthException
 from app.auth.oauth2.google import GoogleOAuth2
 from app.auth.tests import factories
+from app.core.config import settings
 from app.core.exceptions import ApiException
 from app.utils import security
 from app.utils.emails import EmailSender
@@ -70,6 +71,33 @@ async def test_login(client: AsyncClient) -> None:
     await _test_access_token(data["access_token"], user.email)
 
 
+async def test_login_server_timing(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    password = fake.password()
+    user = await factories.UserFactory.create(password=password)
+    monkeypatch.setattr(settings, "SERVER_TIMING", True)
+
+    payload = {"username": user.email, "password": password}
+    res = await client.post("/auth/login", data=payload)
+
+    phases = [
+        item.partition(";")[0] for item in res.headers["Server-Timing"].split(", ")
+    ]
+    assert phases == ["db", "hash", "render", "total"]
+
+
+async def test_me_server_timing_for_superuser(client: AsyncClient) -> None:
+    user = await factories.UserFactory.create()
+    superuser = await factories.UserFactory.create(is_superuser=True)
+
+    for u, exposed in ((user, False), (superuser, True)):
+        token = security.create_access_token(u.id)
+        headers = {"Authorization": f"Bearer {token}"}
+        res = await client.get("/auth/me", headers=headers)
+        assert ("Server-Timing" in res.headers) is exposed
+
+
 async def test_login_invalid_creds(client: AsyncClient, user: models.User) -> None:
     payload = {
         "username": user.email,
@@ -126,6 +154,26 @@ async def test_me_update(auth_client: AsyncClient, user: models.User) -> None:
     assert security.verify_password(payload["password"], user.password)
 
 
+async def test_me_read_cached_per_user(
+    auth_client: AsyncClient, user: models.User
+) -> None:
+    res = await auth_client.get("/auth/me")
+    assert res.headers["Vary"] == "Authorization, Accept-Language"
+    assert res.headers["Cache-Control"].startswith("private, max-age=")
+    assert "ETag" in res.headers
+
+    await auth_client.patch("/auth/me", json={"full_name": "Updated Name"})
+    res = await auth_client.get("/auth/me")
+    assert res.json()["fullName"] == "Updated Name"
+
+    other = await factories.UserFactory.create()
+    token = security.create_access_token(other.id)
+    res = await auth_client.get(
+        "/auth/me", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert res.json()["email"] == other.email
+
+
 async def test_me_delete(auth_client: AsyncClient, user: models.User) -> None:
     res = await auth_client.delete("/auth/me")
     assert res.is_success
@@ -148,6 +196,22 @@ async def test_forgot_password(
     assert spy.call_args[0][0] == [user.email]
 
 
+async def test_forgot_password_localized(
+    client: AsyncClient, user: models.User, mocker: MockerFixture
+) -> None:
+    spy = mocker.spy(EmailSender, "send_email")
+
+    payload = {"email": user.email}
+    headers = {"Accept-Language": "tr"}
+    res = await client.post("/auth/forgot-password", json=payload, headers=headers)
+    assert res.is_success
+
+    _, subject, _, html = spy.call_args[0]
+    assert subject == "Şifre Sıfırlama"
+    assert '<html lang="tr"' in html
+    assert "Şifremi Sıfırla" in html
+
+
 async def test_reset_password(client: AsyncClient, user: models.User) -> None:
     token = security.create_password_reset_token(user.id)
 
@@ -0,0 +1,179 @@
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import Collection, Sequence
+
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.exceptions import ApiException
+from app.core.metrics import Metrics
+
+
+class AdaptiveLimit:
+    """A cap on concurrent requests with a short queue in front of it.
+
+    With `adaptive=True` the limit follows the latency of completed requests
+    (Netflix's gradient2): it shrinks when recent requests are slower than the
+    long term average by more than `tolerance`, and otherwise grows by the
+    square root of itself, staying between `min_limit` and `max_limit`. The
+    state is per worker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int = settings.ADMISSION_LIMIT,
+        min_limit: int = settings.ADMISSION_MIN_LIMIT,
+        max_limit: int = settings.ADMISSION_MAX_LIMIT,
+        queue_size: int = settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT,
+        adaptive: bool = True,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        long_window: int = 600,
+    ) -> None:
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.long_latency = 0.0
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future[bool]] = deque()
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed. False if shed."""
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            Metrics.inc("admission_shed_total", limit=self.name, reason="queue_full")
+            return False
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.waiters.append(waiter)
+        timer = loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self.waiters.remove(waiter)
+            elif waiter.result():
+                # the slot was handed over just before the cancellation
+                self._free()
+            raise
+        finally:
+            timer.cancel()
+
+    def release(self, latency: float | None = None) -> None:
+        """Free a slot, adapting the limit to the request's latency if known."""
+        if latency is not None and self.adaptive:
+            self._update(latency)
+        self._free()
+
+    def _expire(self, waiter: asyncio.Future[bool]) -> None:
+        if not waiter.done():
+            self.waiters.remove(waiter)
+            waiter.set_result(False)
+            Metrics.inc("admission_shed_total", limit=self.name, reason="timeout")
+
+    def _free(self) -> None:
+        self.in_flight -= 1
+        # admit the oldest waiters, more than one if the limit grew
+        while self.waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.waiters.popleft().set_result(True)
+
+    def _update(self, latency: float) -> None:
+        if not self.long_latency:
+            self.long_latency = latency
+            return
+        self.long_latency += (latency - self.long_latency) * 2 / (self.long_window + 1)
+        if self.long_latency > 2 * latency:
+            # recover faster after a period of high latency
+            self.long_latency *= 0.95
+
+        # growing is pointless while most of the limit is unused
+        if self.in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / latency))
+        limit = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+
+class AdmissionRule:
+    """A concurrency limit for requests whose path matches a route template,
+    optionally only for some methods."""
+
+    def __init__(
+        self,
+        path: str,
+        limit: AdaptiveLimit,
+        methods: Collection[str] | None = None,
+    ) -> None:
+        self.path = path
+        self.limit = limit
+        self.methods = {method.upper() for method in methods} if methods else None
+        self.regex = compile_path(path)[0]
+
+    def matches(self, scope: Scope) -> bool:
+        if self.methods is not None and scope["method"] not in self.methods:
+            return False
+        return self.regex.match(scope["path"]) is not None
+
+
+class AdmissionMiddleware:
+    """Apply the concurrency limit of the first matching rule to each request.
+
+    Requests shed because the queue is full or they waited too long get a
+    503 with Retry-After built once up front, so an overloaded worker answers
+    them fast instead of letting the latency of every request grow. Add it
+    inside CORSMiddleware, so that browsers can read the 503.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[AdmissionRule]) -> None:
+        self.app = app
+        self.rules = rules
+        response = ApiException(
+            "Service Unavailable",
+            503,
+            "app",
+            "overloaded",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+        ).to_response()
+        self.body = response.body
+        self.headers = response.raw_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = None
+        if scope["type"] == "http":
+            rule = next((rule for rule in self.rules if rule.matches(scope)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = rule.limit
+        if not await limit.acquire():
+            await send(
+                {"type": "http.response.start", "status": 503, "headers": self.headers}
+            )
+            await send({"type": "http.response.body", "body": self.body})
+            return
+
+        started = time.perf_counter()
+        latency = None
+        try:
+            await self.app(scope, receive, send)
+            latency = time.perf_counter() - started
+        finally:
+            limit.release(latency)
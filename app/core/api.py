@@ -1,6 +1,21 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 
 from app.auth.api import router as auth_router
+from app.core.cache import Cache
+from app.core.metrics import Metrics, verify_metrics_token
 
 router = APIRouter(prefix="/api/v1")
 router.include_router(auth_router, prefix="/auth", tags=["auth"])
+
+
+@router.get(
+    "/metrics",
+    include_in_schema=False,
+    dependencies=[Depends(verify_metrics_token)],
+)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        await Metrics.render(Cache.backend),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,760 @@
+import asyncio
+import bisect
+import hashlib
+import math
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any, Generic, TypeVar
+
+import orjson
+from redis import asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.commands.core import AsyncScript
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.core.config import settings
+
+
+class BackendException(Exception):
+    pass
+
+
+class Script:
+    """A Lua script paired with its equivalent for the in-memory backend.
+
+    `func` receives the memory backend, keys and string arguments like the Lua
+    source receives KEYS and ARGV, and must return what Redis would.
+    """
+
+    def __init__(
+        self, source: str, func: Callable[["MemoryBackend", list[str], list[str]], Any]
+    ) -> None:
+        self.source = source
+        self.func = func
+
+
+def _invalidate_tags(backend: "MemoryBackend", keys: list[str], args: list[str]) -> Any:
+    removed: list[str] = []
+    for tag_key in keys:
+        members = backend.smembers(tag_key)
+        backend.delete(*members, tag_key)
+        removed.extend(members)
+    if args[0] and removed:
+        backend.broadcast(args[0], orjson.dumps(removed))
+    return [key.encode() for key in removed]
+
+
+invalidate_tags = Script(
+    """local channel = ARGV[1]
+local removed = {}
+for _, tag_key in ipairs(KEYS) do
+  local members = redis.call("SMEMBERS", tag_key)
+  for i = 1, #members, 1000 do
+    redis.call("UNLINK", unpack(members, i, math.min(i + 999, #members)))
+  end
+  for _, member in ipairs(members) do
+    removed[#removed + 1] = member
+  end
+  redis.call("UNLINK", tag_key)
+end
+if channel ~= "" and #removed > 0 then
+  redis.call("PUBLISH", channel, cjson.encode(removed))
+end
+return removed""",
+    _invalidate_tags,
+)
+
+
+def _pop_members(backend: "MemoryBackend", keys: list[str], args: list[str]) -> Any:
+    members = backend.smembers(keys[0])
+    backend.delete(keys[0])
+    return [key.encode() for key in members]
+
+
+pop_members = Script(
+    """local members = redis.call("SMEMBERS", KEYS[1])
+redis.call("UNLINK", KEYS[1])
+return members""",
+    _pop_members,
+)
+
+
+def hash_tag(key: str) -> str:
+    """Return the part of `key` that decides its shard, as Redis Cluster does.
+
+    That is the substring between the first `{` and the following `}` if it is
+    not empty, otherwise the whole key.
+    """
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]
+    return key
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes over a list of shards.
+
+    Shards are named by their position, so new shards must be appended to keep
+    most keys where they are.
+    """
+
+    def __init__(self, size: int, replicas: int = 160) -> None:
+        points = sorted(
+            (_hash(f"shard-{shard}-{i}"), shard)
+            for shard in range(size)
+            for i in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def get(self, key: str) -> int:
+        i = bisect.bisect(self._points, _hash(hash_tag(key)))
+        return self._shards[i % len(self._shards)]
+
+
+class Backend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def get_with_ttl(self, key: str) -> tuple[bytes | None, int]:
+        ...
+
+    @abstractmethod
+    async def get_many(
+        self, keys: Sequence[str], with_ttl: bool = False
+    ) -> list[tuple[bytes | None, int]]:
+        ...
+
+    @abstractmethod
+    async def set(
+        self, key: str, value: bytes | str, ttl: float | None = None, nx: bool = False
+    ) -> bool:
+        ...
+
+    @abstractmethod
+    async def set_many(
+        self,
+        items: Sequence[tuple[str, bytes, int]],
+        tag_keys: Sequence[str] = (),
+        channel: str | None = None,
+    ) -> None:
+        """Set every item and add its key to each tag set, atomically."""
+
+    @abstractmethod
+    async def add_to_tags(
+        self, tag_keys: Sequence[str], keys: Sequence[str], ttl: int
+    ) -> None:
+        """Add keys to each tag set and keep the set alive for at least `ttl`."""
+
+    @abstractmethod
+    async def delete_many(
+        self, keys: Sequence[str], channel: str | None = None
+    ) -> None:
+        ...
+
+    @abstractmethod
+    async def invalidate(
+        self, tag_keys: Sequence[str], channel: str | None = None
+    ) -> list[str]:
+        """Delete the tag sets and every key in them, returning those keys."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        ...
+
+    @abstractmethod
+    async def run_script(
+        self, script: Script, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+async def _listen(client: aioredis.Redis, channel: str) -> AsyncIterator[bytes]:
+    async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+        await pubsub.subscribe(channel)
+        while True:
+            # poll instead of blocking on the socket, which has a read timeout
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=1.0
+            )
+            if message is not None:
+                yield message["data"]
+
+
+# types-redis leaves the commands off the asyncio RedisCluster, which has the
+# same ones as Redis at runtime, hence the ignores on them below
+ClientT = TypeVar("ClientT", "aioredis.Redis[bytes]", "RedisCluster[bytes]")
+
+
+class BaseRedisBackend(Backend, Generic[ClientT]):
+    """Commands that a standalone Redis and a Redis Cluster run alike."""
+
+    client: ClientT
+
+    def __init__(self, client: ClientT) -> None:
+        self.client = client
+        self._scripts: dict[str, AsyncScript] = {}
+
+    @abstractmethod
+    def _pipeline(self) -> Any:
+        ...
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)  # type: ignore[attr-defined]
+
+    async def get_with_ttl(self, key: str) -> tuple[bytes | None, int]:
+        async with self._pipeline() as pipe:
+            ret, ttl = await pipe.get(key).ttl(key).execute()
+        return ret, ttl
+
+    async def set(
+        self, key: str, value: bytes | str, ttl: float | None = None, nx: bool = False
+    ) -> bool:
+        px = int(ttl * 1000) if ttl is not None else None
+        ret = await self.client.set(  # type: ignore[attr-defined]
+            key, value, px=px, nx=nx
+        )
+        return bool(ret)
+
+    async def set_many(
+        self,
+        items: Sequence[tuple[str, bytes, int]],
+        tag_keys: Sequence[str] = (),
+        channel: str | None = None,
+    ) -> None:
+        keys = [key for key, _, _ in items]
+        async with self._pipeline() as pipe:
+            for key, value, ttl in items:
+                pipe.set(key, value, ex=ttl)
+            self._tag(pipe, tag_keys, keys, max(ttl for _, _, ttl in items))
+            if channel:
+                pipe.publish(channel, _encode_keys(keys))
+            await pipe.execute()
+
+    async def add_to_tags(
+        self, tag_keys: Sequence[str], keys: Sequence[str], ttl: int
+    ) -> None:
+        async with self._pipeline() as pipe:
+            self._tag(pipe, tag_keys, keys, ttl)
+            await pipe.execute()
+
+    @staticmethod
+    def _tag(pipe: Any, tag_keys: Sequence[str], keys: Sequence[str], ttl: int) -> None:
+        for tag_key in tag_keys:
+            pipe.sadd(tag_key, *keys)
+            # a tag set must outlive every key it tracks
+            pipe.expire(tag_key, ttl, nx=True)
+            pipe.expire(tag_key, ttl, gt=True)
+
+    async def run_script(
+        self, script: Script, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        registered = self._scripts.get(script.source)
+        if registered is None:
+            registered = self.client.register_script(  # type: ignore[attr-defined]
+                script.source
+            )
+            self._scripts[script.source] = registered
+        return await registered(keys, args)
+
+
+class RedisBackend(BaseRedisBackend["aioredis.Redis[bytes]"]):
+    def __init__(self, url: str, **options: Any) -> None:
+        # wait for a free connection under bursts instead of failing
+        pool: aioredis.BlockingConnectionPool = (
+            aioredis.BlockingConnectionPool.from_url(
+                url, timeout=options.get("socket_timeout"), **options
+            )
+        )
+        super().__init__(aioredis.Redis(connection_pool=pool))
+
+    def _pipeline(self) -> Any:
+        return self.client.pipeline(transaction=True)
+
+    async def get_many(
+        self, keys: Sequence[str], with_ttl: bool = False
+    ) -> list[tuple[bytes | None, int]]:
+        if not with_ttl:
+            return [(ret, -2) for ret in await self.client.mget(keys)]
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.mget(keys)
+            for key in keys:
+                pipe.ttl(key)
+            rets, *ttls = await pipe.execute()
+        return list(zip(rets, ttls, strict=True))
+
+    async def delete_many(
+        self, keys: Sequence[str], channel: str | None = None
+    ) -> None:
+        if not channel:
+            await self.client.unlink(*keys)
+            return
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.unlink(*keys)
+            pipe.publish(channel, _encode_keys(keys))
+            await pipe.execute()
+
+    async def invalidate(
+        self, tag_keys: Sequence[str], channel: str | None = None
+    ) -> list[str]:
+        removed = await self.run_script(invalidate_tags, tag_keys, [channel or ""])
+        return [key.decode() for key in removed]
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.publish(channel, message)
+
+    def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        return _listen(self.client, channel)
+
+    async def close(self) -> None:
+        await self.client.close(close_connection_pool=True)
+
+
+class RedisClusterBackend(BaseRedisBackend["RedisCluster[bytes]"]):
+    """Redis Cluster, sharded by hash slot on the server side.
+
+    Cluster pipelines cannot be transactions, so bulk writes are not atomic
+    across slots, and invalidating a tag whose keys live in other slots than
+    its set takes a second round trip.
+    """
+
+    def __init__(self, url: str, **options: Any) -> None:
+        super().__init__(RedisCluster.from_url(url, **options))
+        self._options = options
+
+    def _pipeline(self) -> Any:
+        return self.client.pipeline()
+
+    async def get_many(
+        self, keys: Sequence[str], with_ttl: bool = False
+    ) -> list[tuple[bytes | None, int]]:
+        async with self._pipeline() as pipe:
+            for key in keys:
+                pipe.get(key)
+                if with_ttl:
+                    pipe.ttl(key)
+            rets = await pipe.execute()
+        if not with_ttl:
+            return [(ret, -2) for ret in rets]
+        return list(zip(rets[::2], rets[1::2], strict=True))
+
+    async def set_many(
+        self,
+        items: Sequence[tuple[str, bytes, int]],
+        tag_keys: Sequence[str] = (),
+        channel: str | None = None,
+    ) -> None:
+        await super().set_many(items, tag_keys)
+        if channel:
+            await self.publish(channel, _encode_keys([key for key, _, _ in items]))
+
+    async def delete_many(
+        self, keys: Sequence[str], channel: str | None = None
+    ) -> None:
+        await self.client.unlink(*keys)  # type: ignore[attr-defined]
+        if channel:
+            await self.publish(channel, _encode_keys(keys))
+
+    async def invalidate(
+        self, tag_keys: Sequence[str], channel: str | None = None
+    ) -> list[str]:
+        results = await asyncio.gather(
+            *[self.run_script(pop_members, [tag_key], []) for tag_key in tag_keys]
+        )
+        removed = [key.decode() for members in results for key in members]
+        if removed:
+            await self.delete_many(removed, channel)
+        return removed
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.execute_command(
+            "PUBLISH", channel, message, target_nodes=RedisCluster.RANDOM
+        )
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        # messages are broadcast to the whole cluster, so any node will do
+        await self.client.initialize()
+        node = self.client.get_default_node()
+        client = aioredis.Redis(host=node.host, port=int(node.port), **self._options)
+        try:
+            async for message in _listen(client, channel):
+                yield message
+        finally:
+            await client.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class ShardedBackend(Backend):
+    """Client-side sharding over independent backends.
+
+    Keys are placed on a consistent-hash ring by their hash tag, so keys that
+    share one always land on the same shard and scripts over them stay
+    atomic. Pub/sub goes through the first shard.
+    """
+
+    def __init__(self, shards: Sequence[Backend], replicas: int = 160) -> None:
+        if not shards:
+            raise BackendException("At least one shard is required")
+        self.shards = list(shards)
+        self.ring = HashRing(len(self.shards), replicas)
+
+    def shard(self, key: str) -> Backend:
+        return self.shards[self.ring.get(key)]
+
+    def _group(self, keys: Sequence[str]) -> dict[int, list[str]]:
+        groups: dict[int, list[str]] = {}
+        for key in keys:
+            groups.setdefault(self.ring.get(key), []).append(key)
+        return groups
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.shard(key).get(key)
+
+    async def get_with_ttl(self, key: str) -> tuple[bytes | None, int]:
+        return await self.shard(key).get_with_ttl(key)
+
+    async def get_many(
+        self, keys: Sequence[str], with_ttl: bool = False
+    ) -> list[tuple[bytes | None, int]]:
+        groups = self._group(keys)
+        results = await asyncio.gather(
+            *[self.shards[i].get_many(group, with_ttl) for i, group in groups.items()]
+        )
+        found: dict[str, tuple[bytes | None, int]] = {}
+        for group, rets in zip(groups.values(), results, strict=True):
+            found.update(zip(group, rets, strict=True))
+        return [found[key] for key in keys]
+
+    async def set(
+        self, key: str, value: bytes | str, ttl: float | None = None, nx: bool = False
+    ) -> bool:
+        return await self.shard(key).set(key, value, ttl, nx)
+
+    async def set_many(
+        self,
+        items: Sequence[tuple[str, bytes, int]],
+        tag_keys: Sequence[str] = (),
+        channel: str | None = None,
+    ) -> None:
+        keys = [key for key, _, _ in items]
+        groups: dict[int, list[tuple[str, bytes, int]]] = {}
+        for item in items:
+            groups.setdefault(self.ring.get(item[0]), []).append(item)
+        tag_groups = self._group(tag_keys)
+
+        # track keys in tag sets on other shards first, so none goes untracked
+        max_ttl = max(ttl for _, _, ttl in items)
+        await asyncio.gather(
+            *[
+                self.shards[i].add_to_tags(tags, others, max_ttl)
+                for i, tags in tag_groups.items()
+                if (others := [key for key in keys if self.ring.get(key) != i])
+            ]
+        )
+        await asyncio.gather(
+            *[
+                self.shards[i].set_many(group, tag_groups.get(i, ()))
+                for i, group in groups.items()
+            ]
+        )
+        if channel:
+            await self.publish(channel, _encode_keys(keys))
+
+    async def add_to_tags(
+        self, tag_keys: Sequence[str], keys: Sequence[str], ttl: int
+    ) -> None:
+        await asyncio.gather(
+            *[
+                self.shards[i].add_to_tags(tags, keys, ttl)
+                for i, tags in self._group(tag_keys).items()
+            ]
+        )
+
+    async def delete_many(
+        self, keys: Sequence[str], channel: str | None = None
+    ) -> None:
+        await asyncio.gather(
+            *[
+                self.shards[i].delete_many(group)
+                for i, group in self._group(keys).items()
+            ]
+        )
+        if channel:
+            await self.publish(channel, _encode_keys(keys))
+
+    async def invalidate(
+        self, tag_keys: Sequence[str], channel: str | None = None
+    ) -> list[str]:
+        groups = self._group(tag_keys)
+        # keys sharing their tag set's shard are removed atomically with it
+        results = await asyncio.gather(
+            *[self.shards[i].invalidate(group) for i, group in groups.items()]
+        )
+        elsewhere = [
+            key
+            for i, removed in zip(groups, results, strict=True)
+            for key in removed
+            if self.ring.get(key) != i
+        ]
+        if elsewhere:
+            await self.delete_many(elsewhere)
+
+        removed = [key for keys in results for key in keys]
+        if channel and removed:
+            await self.publish(channel, _encode_keys(removed))
+        return removed
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.shards[0].publish(channel, message)
+
+    def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        return self.shards[0].subscribe(channel)
+
+    async def run_script(
+        self, script: Script, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        shards = {self.ring.get(key) for key in keys}
+        if len(shards) > 1:
+            raise BackendException("Script keys must share a hash tag")
+        return await self.shards[shards.pop() if shards else 0].run_script(
+            script, keys, args
+        )
+
+    async def close(self) -> None:
+        await asyncio.gather(*[shard.close() for shard in self.shards])
+
+
+class MemoryBackend(Backend):
+    """Process-local backend with Redis semantics for TTLs and scripts.
+
+    Every operation runs without yielding to the event loop, so each one,
+    including scripts, is atomic like its Redis counterpart. State is not
+    shared between processes.
+    """
+
+    purge_interval = 1000
+
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[Any, float]] = {}
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._writes = 0
+
+    # Primitives that scripts can use, named after the Redis commands
+
+    def get_value(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set_value(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else math.inf
+        self._data[key] = (value, expires_at)
+        self._writes += 1
+        if self._writes % self.purge_interval == 0:
+            self.purge()
+
+    def pttl(self, key: str) -> int:
+        if self.get_value(key) is None:
+            return -2
+        expires_at = self._data[key][1]
+        if expires_at == math.inf:
+            return -1
+        return math.ceil((expires_at - time.monotonic()) * 1000)
+
+    def ttl(self, key: str) -> int:
+        pttl = self.pttl(key)
+        return pttl if pttl < 0 else math.ceil(pttl / 1000)
+
+    def expire(self, key: str, ttl: float, nx: bool = False, gt: bool = False) -> bool:
+        current = self.pttl(key)
+        if current == -2 or (nx and current != -1):
+            return False
+        if gt and (current == -1 or current >= ttl * 1000):
+            return False
+        self._data[key] = (self._data[key][0], time.monotonic() + ttl)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        value = int(self.get_value(key) or 0) + amount
+        pttl = self.pttl(key)
+        self.set_value(key, value, pttl / 1000 if pttl > 0 else None)
+        return value
+
+    def sadd(self, key: str, *members: str) -> int:
+        current = self.get_value(key)
+        if current is None:
+            current = set()
+            self.set_value(key, current)
+        added = len(set(members) - current)
+        current.update(members)
+        return added
+
+    def smembers(self, key: str) -> set[str]:
+        return set(self.get_value(key) or ())
+
+    def hincrbyfloat(self, key: str, field: str, amount: float) -> float:
+        current = self.get_value(key)
+        if current is None:
+            current = {}
+            self.set_value(key, current)
+        current[field] = current.get(field, 0.0) + amount
+        return current[field]
+
+    def hgetall(self, key: str) -> dict[str, float]:
+        return dict(self.get_value(key) or {})
+
+    def broadcast(self, channel: str, message: bytes) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+
+    def purge(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (_, exp) in self._data.items() if exp <= now]:
+            del self._data[key]
+
+    # Backend interface
+
+    async def get(self, key: str) -> bytes | None:
+        return self.get_value(key)
+
+    async def get_with_ttl(self, key: str) -> tuple[bytes | None, int]:
+        return self.get_value(key), self.ttl(key)
+
+    async def get_many(
+        self, keys: Sequence[str], with_ttl: bool = False
+    ) -> list[tuple[bytes | None, int]]:
+        return [
+            (self.get_value(key), self.ttl(key) if with_ttl else -2) for key in keys
+        ]
+
+    async def set(
+        self, key: str, value: bytes | str, ttl: float | None = None, nx: bool = False
+    ) -> bool:
+        if nx and self.get_value(key) is not None:
+            return False
+        self.set_value(key, value, ttl)
+        return True
+
+    async def set_many(
+        self,
+        items: Sequence[tuple[str, bytes, int]],
+        tag_keys: Sequence[str] = (),
+        channel: str | None = None,
+    ) -> None:
+        keys = [key for key, _, _ in items]
+        for key, value, ttl in items:
+            self.set_value(key, value, ttl)
+        await self.add_to_tags(tag_keys, keys, max(ttl for _, _, ttl in items))
+        if channel:
+            self.broadcast(channel, _encode_keys(keys))
+
+    async def add_to_tags(
+        self, tag_keys: Sequence[str], keys: Sequence[str], ttl: int
+    ) -> None:
+        for tag_key in tag_keys:
+            self.sadd(tag_key, *keys)
+            self.expire(tag_key, ttl, nx=True)
+            self.expire(tag_key, ttl, gt=True)
+
+    async def delete_many(
+        self, keys: Sequence[str], channel: str | None = None
+    ) -> None:
+        self.delete(*keys)
+        if channel:
+            self.broadcast(channel, _encode_keys(keys))
+
+    async def invalidate(
+        self, tag_keys: Sequence[str], channel: str | None = None
+    ) -> list[str]:
+        removed = await self.run_script(invalidate_tags, tag_keys, [channel or ""])
+        return [key.decode() for key in removed]
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        self.broadcast(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].discard(queue)
+
+    async def run_script(
+        self, script: Script, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        return script.func(self, list(keys), [str(arg) for arg in args])
+
+    async def close(self) -> None:
+        # nothing to release, the data lives in this process
+        pass
+
+
+def _encode_keys(keys: Sequence[str]) -> bytes:
+    return orjson.dumps(list(keys))
+
+
+def connection_options() -> dict[str, Any]:
+    return {
+        "max_connections": settings.CACHE_MAX_CONNECTIONS,
+        "socket_timeout": settings.CACHE_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.CACHE_SOCKET_CONNECT_TIMEOUT,
+        "health_check_interval": settings.CACHE_HEALTH_CHECK_INTERVAL,
+        "retry": Retry(ExponentialBackoff(cap=1, base=0.05), settings.CACHE_RETRIES),
+        "retry_on_error": [ConnectionError, TimeoutError],
+    }
+
+
+def get_backend(name: str) -> Backend:
+    if name in ("redis", "cluster"):
+        if not settings.CACHE_URI:
+            raise BackendException(f"CACHE_URI is required for the {name} backend")
+        if name == "cluster":
+            return RedisClusterBackend(settings.CACHE_URI, **connection_options())
+        return RedisBackend(settings.CACHE_URI, **connection_options())
+    if name == "sharded":
+        if not settings.CACHE_SHARD_URIS:
+            raise BackendException("CACHE_SHARD_URIS is required for sharding")
+        return ShardedBackend(
+            [
+                RedisBackend(url, **connection_options())
+                for url in settings.CACHE_SHARD_URIS
+            ]
+        )
+    if name == "memory":
+        return MemoryBackend()
+    raise BackendException(f"Unknown cache backend: {name}")
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from app.core.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+class CircuitBreaker:
+    """Stop calling a slow or failing dependency for a while.
+
+    Each call gets `timeout` seconds. After `failure_threshold` failures in a
+    row the circuit opens and calls return their fallback right away. After
+    `recovery_time` seconds it half opens and lets a single probe through,
+    which closes the circuit again if it succeeds. The state is per worker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        failure_threshold: int = 5,
+        recovery_time: float = 5.0,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_time:
+                return False
+            self._transition("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    async def call(self, func: Callable[[], Awaitable[R]], fallback: R) -> R:
+        """Return what `func` returns, or `fallback` if it fails, takes longer
+        than the timeout or the circuit is open."""
+        if not self.allow():
+            Metrics.inc(
+                "circuit_breaker_fallbacks_total", breaker=self.name, reason="open"
+            )
+            return fallback
+
+        probe = self.state == "half_open"
+        try:
+            # redis-py >= 4.5.4 drops a connection whose command is cancelled
+            # here, older versions could hand its reply to the next command
+            ret = await asyncio.wait_for(func(), self.timeout)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            Metrics.inc(
+                "circuit_breaker_fallbacks_total", breaker=self.name, reason=reason
+            )
+            self._failure(e)
+            return fallback
+        finally:
+            if probe:
+                self._probing = False
+
+        self.failures = 0
+        if self.state != "closed":
+            self._transition("closed")
+        return ret
+
+    def _failure(self, error: Exception) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self._transition("open", error)
+
+    def _transition(self, state: str, error: Exception | None = None) -> None:
+        self.state = state
+        Metrics.inc("circuit_breaker_transitions_total", breaker=self.name, state=state)
+        if error is not None:
+            logger.warning(
+                f"Circuit breaker {self.name} {state} after {self.failures} "
+                f"failures, last: {error!r}"
+            )
+        else:
+            logger.warning(f"Circuit breaker {self.name} {state}")
@@ -1,99 +1,422 @@
 import asyncio
+import hashlib
 import inspect
+import logging
+import math
 import pickle
-from collections.abc import Awaitable, Callable
-from functools import wraps
-from typing import Any, ParamSpec, TypeAlias, TypeVar, cast
+import random
+import time
+import uuid
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable, Callable, Iterator, Mapping, Sequence
+from contextlib import contextmanager, suppress
+from functools import partial, wraps
+from typing import Any, NamedTuple, ParamSpec, TypeAlias, TypeVar, cast
 from urllib.parse import urlencode
 
-from fastapi import Request, Response
+import orjson
+from fastapi import BackgroundTasks, Request, Response, params
 from fastapi.concurrency import run_in_threadpool
-from redis import asyncio as aioredis
-from redis.commands.core import AsyncScript
-
-from app.core import translation
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute, serialize_response
+from fastapi.security import SecurityScopes
+from starlette.requests import HTTPConnection
+
+from app.core import compression, timing, translation
+from app.core.backends import Backend, MemoryBackend, Script, get_backend
+from app.core.breaker import CircuitBreaker
 from app.core.config import settings
+from app.core.metrics import SIZE_BUCKETS, Metrics, route_label
+from app.core.serializers import Serializer
+
+logger = logging.getLogger(__name__)
+
+# what backends return for a key they do not have, and the breaker's fallback
+MISSING: tuple[bytes | None, int] = (None, -2)
+
+
+def _chunked(keys: Sequence[str], size: int) -> Iterator[Sequence[str]]:
+    for i in range(0, len(keys), size):
+        yield keys[i : i + size]
+
+
+class LocalCache:
+    """Per-worker LRU kept in front of Redis.
+
+    Values are held as the decoded objects, so callers must not mutate what
+    they get back. Entries live for at most `ttl` seconds locally, which bounds
+    staleness if an invalidation message is missed.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[Any, float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> tuple[Any, int] | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        value, expires_at, evict_at = item
+        now = time.monotonic()
+        if min(expires_at, evict_at) <= now:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        ttl = -1 if expires_at == math.inf else math.ceil(expires_at - now)
+        return value, ttl
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.monotonic()
+        expires_at = now + ttl if ttl >= 0 else math.inf
+        self._data[key] = (value, expires_at, now + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class CacheScript(Script):
+    async def __call__(self, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        return await Cache.backend.run_script(self, keys, args)
 
 
 class Cache:
-    client = aioredis.from_url(settings.CACHE_URI)
+    backend: Backend = get_backend(settings.CACHE_BACKEND)
+    local: LocalCache | None = (
+        LocalCache(settings.CACHE_LOCAL_SIZE, settings.CACHE_LOCAL_TTL)
+        if settings.CACHE_LOCAL_SIZE > 0
+        else None
+    )
+    serializer = Serializer(
+        settings.CACHE_CODEC,
+        settings.CACHE_COMPRESSION,
+        settings.CACHE_COMPRESSION_THRESHOLD,
+    )
+    # while the backend is slow or down reads miss and writes are skipped
+    breaker = CircuitBreaker(
+        "cache",
+        settings.CACHE_CALL_TIMEOUT,
+        settings.BREAKER_FAILURE_THRESHOLD,
+        settings.BREAKER_RECOVERY_TIME,
+    )
+    stats: Counter[str] = Counter()
+    invalidation_channel = "cache:invalidate"
+    chunk_size = 500
+
+    _listener: asyncio.Task | None = None
+    _flusher: asyncio.Task | None = None
 
     @classmethod
     async def get(cls, key: str, default: Any = None) -> Any:
-        ret = await cls.client.get(key)
+        if cls.local is not None:
+            ret, _ = await cls.get_with_ttl(key, default)
+            return ret
+
+        with cls._timer("get"):
+            ret = await cls.breaker.call(partial(cls.backend.get, key), None)
+        cls._record("remote", ret is not None)
         if ret is None:
             return default
-        return pickle.loads(ret)
+        return Serializer.loads(ret)
 
     @classmethod
     async def get_with_ttl(cls, key: str, default: Any = None) -> tuple[Any, int]:
-        async with cls.client.pipeline(transaction=True) as pipe:
-            ret, ttl = await pipe.get(key).ttl(key).execute()
-            if not ret:
-                return default, ttl
-            return pickle.loads(ret), ttl
+        if cls.local is not None:
+            item = cls.local.get(key)
+            cls._record("local", item is not None)
+            if item is not None:
+                return item
+
+        with cls._timer("get"):
+            ret, ttl = await cls.breaker.call(
+                partial(cls.backend.get_with_ttl, key), MISSING
+            )
+
+        cls._record("remote", bool(ret))
+        if not ret:
+            return default, ttl
+
+        value = Serializer.loads(ret)
+        if cls.local is not None:
+            cls.local.set(key, value, ttl)
+        return value, ttl
 
     @classmethod
-    async def set(cls, key: str, value: Any, timeout: int = 3 * 60) -> None:
-        await cls.client.set(key, pickle.dumps(value), ex=timeout)
+    async def get_many(cls, keys: Sequence[str], default: Any = None) -> list[Any]:
+        values: dict[str, Any] = {}
+        missing = list(keys)
+        if cls.local is not None:
+            missing = []
+            for key in keys:
+                item = cls.local.get(key)
+                cls._record("local", item is not None)
+                if item is None:
+                    missing.append(key)
+                else:
+                    values[key] = item[0]
+
+        for chunk in _chunked(missing, cls.chunk_size):
+            with cls._timer("get_many"):
+                rets = await cls.breaker.call(
+                    partial(cls.backend.get_many, chunk, cls.local is not None),
+                    [MISSING] * len(chunk),
+                )
+            for key, (ret, ttl) in zip(chunk, rets, strict=True):
+                cls._record("remote", ret is not None)
+                if ret is None:
+                    continue
+                values[key] = Serializer.loads(ret)
+                if cls.local is not None:
+                    cls.local.set(key, values[key], ttl)
+
+        return [values.get(key, default) for key in keys]
+
+    @classmethod
+    async def set(
+        cls,
+        key: str,
+        value: Any,
+        timeout: int = 3 * 60,
+        tags: Sequence[str] = (),
+        serializer: Serializer | None = None,
+    ) -> None:
+        if cls.local is None and not tags:
+            data = (serializer or cls.serializer).dumps(value)
+            cls.stats["writes"] += 1
+            cls._observe_size(data)
+            with cls._timer("set"):
+                await cls.breaker.call(
+                    partial(cls.backend.set, key, data, timeout), False
+                )
+            return
+
+        await cls.set_many({key: value}, timeout, tags, serializer)
+
+    @classmethod
+    async def set_many(
+        cls,
+        items: Mapping[str, Any],
+        timeout: int | Mapping[str, int] = 3 * 60,
+        tags: Sequence[str] = (),
+        serializer: Serializer | None = None,
+    ) -> None:
+        serializer = serializer or cls.serializer
+        keys = list(items)
+        if cls.local is not None:
+            cls.local.delete(*keys)
+
+        tag_keys = [cls.tag_key(tag) for tag in tags]
+        cls.stats["writes"] += len(keys)
+        for chunk in _chunked(keys, cls.chunk_size):
+            batch = []
+            for key in chunk:
+                data = serializer.dumps(items[key])
+                cls._observe_size(data)
+                ttl = timeout if isinstance(timeout, int) else timeout[key]
+                batch.append((key, data, ttl))
+            # one atomic write per chunk so that keys and their tags land together
+            with cls._timer("set_many"):
+                await cls.breaker.call(
+                    partial(cls.backend.set_many, batch, tag_keys, cls._channel()),
+                    None,
+                )
 
     @classmethod
     async def delete(cls, *keys: str) -> None:
-        await asyncio.gather(*[cls.client.delete(key) for key in keys])
+        await cls.delete_many(keys)
 
     @classmethod
-    def register_script(cls, script: str) -> AsyncScript:
-        return cls.client.register_script(script)
+    async def delete_many(cls, keys: Sequence[str]) -> None:
+        if cls.local is not None:
+            cls.local.delete(*keys)
 
+        for chunk in _chunked(keys, cls.chunk_size):
+            with cls._timer("delete_many"):
+                await cls.backend.delete_many(chunk, cls._channel())
 
-class CacheInvalidator:
-    def __init__(self, main_key: str) -> None:
-        self.main_key = main_key.lower()
+    @classmethod
+    def register_script(
+        cls, script: str, func: Callable[[MemoryBackend, list[str], list[str]], Any]
+    ) -> CacheScript:
+        return CacheScript(script, func)
 
     @classmethod
-    async def invalidate(cls, main_key: str) -> None:
-        obj = cls(main_key)
-        keys = await obj.get_flush_list()
-        await Cache.delete(*keys)
-        await obj.set_flush_list(set())
+    def tag_key(cls, tag: str) -> str:
+        # hash tagged like the keys of the route, so both share a shard
+        return f"tag:{{{tag}}}"
 
-    async def get_flush_list(self) -> set:
-        return await Cache.get(self._flush_key, set())
+    @classmethod
+    async def startup(cls) -> None:
+        if cls.local is not None and cls._listener is None:
+            cls._listener = asyncio.create_task(cls._listen())
+        if cls._flusher is None:
+            cls._flusher = asyncio.create_task(cls._flush_metrics())
 
-    async def set_flush_list(self, flush_list: set) -> None:
-        await Cache.set(self._flush_key, flush_list, timeout=24 * 60 * 60)
+    @classmethod
+    async def shutdown(cls) -> None:
+        for task in (cls._listener, cls._flusher):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        cls._listener = cls._flusher = None
+        try:
+            await Metrics.flush(cls.backend)
+        except Exception:
+            logger.exception("Failed to flush cache metrics")
+        await cls.backend.close()
 
-    async def add_to_flush_list(self, new_key: str) -> None:
-        flush_list = await self.get_flush_list()
-        flush_list.add(new_key)
-        await self.set_flush_list(flush_list)
+    @classmethod
+    async def _listen(cls) -> None:
+        local = cast(LocalCache, cls.local)
+        while True:
+            try:
+                messages = cls.backend.subscribe(cls.invalidation_channel)
+                # evictions published while we were not subscribed are lost
+                local.clear()
+                async for message in messages:
+                    local.delete(*orjson.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation listener failed, reconnecting")
+                await asyncio.sleep(1)
 
-    @property
-    def _flush_key(self) -> str:
-        return f"{self.main_key}_flushlist"
+    @classmethod
+    async def _flush_metrics(cls) -> None:
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                await Metrics.flush(cls.backend)
+            except Exception:
+                logger.exception("Failed to flush cache metrics")
+
+    @classmethod
+    def _channel(cls) -> str | None:
+        return cls.invalidation_channel if cls.local is not None else None
+
+    @classmethod
+    def _record(cls, tier: str, hit: bool) -> None:
+        cls.stats[f"{tier}_{'hits' if hit else 'misses'}"] += 1
+        Metrics.inc(
+            "cache_lookups_total",
+            route=route_label.get(),
+            tier=tier,
+            result="hit" if hit else "miss",
+        )
+
+    @classmethod
+    @contextmanager
+    def _timer(cls, op: str) -> Iterator[None]:
+        with timing.span("cache"), Metrics.timer(
+            "cache_backend_seconds", route=route_label.get(), op=op
+        ):
+            yield
+
+    @classmethod
+    def _observe_size(cls, data: bytes) -> None:
+        Metrics.observe(
+            "cache_value_bytes", len(data), SIZE_BUCKETS, route=route_label.get()
+        )
+
+
+class CacheInvalidator:
+    @classmethod
+    async def invalidate(cls, *main_keys: str) -> int:
+        tag_keys = [Cache.tag_key(main_key.lower()) for main_key in main_keys]
+        if not tag_keys:
+            return 0
+
+        with Cache._timer("invalidate"):
+            removed = await Cache.backend.invalidate(tag_keys, Cache._channel())
+        if Cache.local is not None:
+            Cache.local.delete(*removed)
+        return len(removed)
 
 
 class CacheHandler:
-    def __init__(self, main_key: str) -> None:
+    def __init__(
+        self,
+        main_key: str,
+        tags: Sequence[str] = (),
+        serializer: Serializer | None = None,
+        name: str | None = None,
+    ) -> None:
         self.main_key = main_key.lower()
-
-    @property
-    def invalidator(self) -> CacheInvalidator:
-        return CacheInvalidator(self.main_key)
+        self.tags = [self.main_key, *(tag.lower() for tag in tags)]
+        self.serializer = serializer
+        # label of the metrics recorded for this handler, like a route template
+        self.name = name or self.main_key
 
     async def get(self, sub_key: str, default: Any = None) -> Any:
-        return await Cache.get(self._cache_key(sub_key), default)
+        with self._labelled():
+            return await Cache.get(self._cache_key(sub_key), default)
 
     async def get_with_ttl(self, sub_key: str, default: Any = None) -> tuple[Any, int]:
-        return await Cache.get_with_ttl(self._cache_key(sub_key), default)
+        with self._labelled():
+            return await Cache.get_with_ttl(self._cache_key(sub_key), default)
+
+    async def get_many(self, sub_keys: Sequence[str], default: Any = None) -> list[Any]:
+        with self._labelled():
+            return await Cache.get_many(
+                [self._cache_key(key) for key in sub_keys], default
+            )
 
     async def set(self, sub_key: str, result: Any, timeout: int = 300) -> None:
-        cache_key = self._cache_key(sub_key)
-        await Cache.set(cache_key, result, timeout)
-        await self.invalidator.add_to_flush_list(cache_key)
+        with self._labelled():
+            await Cache.set(
+                self._cache_key(sub_key),
+                result,
+                timeout,
+                tags=self.tags,
+                serializer=self.serializer,
+            )
+
+    async def set_many(
+        self, results: Mapping[str, Any], timeout: int | Mapping[str, int] = 300
+    ) -> None:
+        with self._labelled():
+            await Cache.set_many(
+                {self._cache_key(key): value for key, value in results.items()},
+                (
+                    timeout
+                    if isinstance(timeout, int)
+                    else {self._cache_key(key): ttl for key, ttl in timeout.items()}
+                ),
+                tags=self.tags,
+                serializer=self.serializer,
+            )
+
+    async def delete_many(self, sub_keys: Sequence[str]) -> None:
+        with self._labelled():
+            await Cache.delete_many([self._cache_key(key) for key in sub_keys])
+
+    async def invalidate(self) -> int:
+        with self._labelled():
+            return await CacheInvalidator.invalidate(self.main_key)
 
     def _cache_key(self, sub_key: str) -> str:
-        return f"{self.main_key}_{sub_key}"
+        return f"{{{self.main_key}}}_{sub_key}"
+
+    @contextmanager
+    def _labelled(self) -> Iterator[None]:
+        token = route_label.set(self.name)
+        try:
+            yield
+        finally:
+            route_label.reset(token)
 
 
 P = ParamSpec("P")
@@ -102,6 +425,207 @@ Result: TypeAlias = R | Awaitable[R] | Response
 Route: TypeAlias = Callable[P, Result]
 
 
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[R]]) -> R:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(partial(self._forget, key))
+        # a cancelled caller must not cancel the call the others are awaiting
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+def _release_lock(backend: MemoryBackend, keys: list[str], args: list[str]) -> Any:
+    if backend.get_value(keys[0]) == args[0]:
+        return backend.delete(keys[0])
+    return 0
+
+
+class CacheLock:
+    script_str = """if redis.call("GET", KEYS[1]) == ARGV[1] then
+  return redis.call("DEL", KEYS[1])
+end
+return 0"""
+
+    script = Cache.register_script(script_str, _release_lock)
+
+    def __init__(self, key: str, timeout: float) -> None:
+        self.key = f"lock:{key}"
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        # without the backend every caller recomputes, as if it got the lock
+        return await Cache.breaker.call(
+            partial(Cache.backend.set, self.key, self.token, self.timeout, nx=True),
+            True,
+        )
+
+    async def release(self) -> None:
+        await Cache.breaker.call(partial(self.script, [self.key], [self.token]), 0)
+
+
+def make_etag(data: bytes, weak: bool = False) -> str:
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+# set anew for each response, or specific to the request that rendered it
+UNCACHED_HEADERS = (
+    b"cache-control",
+    b"content-length",
+    b"date",
+    b"etag",
+    b"server-timing",
+    b"set-cookie",
+    b"x-request-id",
+)
+
+
+def sets_cookie(response: Response) -> bool:
+    return any(key == b"set-cookie" for key, _ in response.raw_headers)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    status_code: int
+    headers: list[tuple[bytes, bytes]]
+    etag: str
+    # the body in each content encoding, if precompressed
+    encoded: dict[str, bytes] = {}
+
+    @classmethod
+    def from_response(cls, response: Response) -> "CachedResponse":
+        headers = [
+            (key, value)
+            for key, value in response.raw_headers
+            if key not in UNCACHED_HEADERS
+        ]
+        return cls(
+            response.body, response.status_code, headers, make_etag(response.body)
+        )
+
+    async def precompress(self) -> "CachedResponse":
+        """Add the encodings of the body that are smaller than it."""
+        if len(self.body) < settings.COMPRESSION_MINIMUM_SIZE or not (
+            compression.compressible(self.headers)
+        ):
+            return self
+        encoded = {}
+        for encoding in compression.ENCODINGS:
+            data = await compression.compress(encoding, self.body)
+            if len(data) < len(self.body):
+                encoded[encoding] = data
+        return self._replace(encoded=encoded)
+
+    def to_response(self, request: Request, cache_control: str) -> Response:
+        body, encoding = self.body, None
+        if self.encoded:
+            encoding = compression.negotiate(request.headers.get("accept-encoding", ""))
+            if encoding in self.encoded:
+                body = self.encoded[encoding]
+            else:
+                encoding = None
+
+        etag = f"W/{self.etag}" if encoding else self.etag
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        response = Response(body, self.status_code, headers=headers)
+        if encoding:
+            response.raw_headers[:] = compression.encoded_headers(
+                [*response.raw_headers, *self.headers], encoding, len(body)
+            )
+        elif self.encoded:
+            response.raw_headers[:] = compression.vary_on_encoding(
+                [*response.raw_headers, *self.headers]
+            )
+        else:
+            response.raw_headers.extend(self.headers)
+        return response
+
+
+async def render_response(
+    request: Request, response: Response, content: Any
+) -> Response:
+    """Render an endpoint result the same way FastAPI's request handler does."""
+    if isinstance(content, Response):
+        return content
+
+    route: APIRoute = request.scope["route"]
+    response_class: type[Response] = (
+        route.response_class.value
+        if isinstance(route.response_class, DefaultPlaceholder)
+        else route.response_class
+    )
+
+    content = await serialize_response(
+        field=route.response_field,
+        response_content=content,
+        include=route.response_model_include,
+        exclude=route.response_model_exclude,
+        by_alias=route.response_model_by_alias,
+        exclude_unset=route.response_model_exclude_unset,
+        exclude_defaults=route.response_model_exclude_defaults,
+        exclude_none=route.response_model_exclude_none,
+    )
+    status_code = response.status_code or route.status_code
+    rendered = (
+        response_class(content, status_code=status_code)
+        if status_code
+        else response_class(content)
+    )
+    rendered.raw_headers.extend(response.raw_headers)
+    return rendered
+
+
+def sub_response(headers: Mapping[str, str] | None = None) -> Response:
+    """An empty response for an endpoint to set headers and the status code on,
+    like the one FastAPI injects."""
+    response = Response(headers=headers)
+    del response.headers["content-length"]
+    response.status_code = None  # type: ignore[assignment]
+    return response
+
+
+def takes_request_state(func: Route) -> bool:
+    """Whether the endpoint has dependencies, or takes the request, response or
+    anything else that only lives as long as the request."""
+    for param in inspect.signature(func).parameters.values():
+        if isinstance(param.default, params.Depends):
+            return True
+        annotation = param.annotation
+        if inspect.isclass(annotation) and issubclass(
+            annotation, (HTTPConnection, Response, BackgroundTasks, SecurityScopes)
+        ):
+            return True
+    return False
+
+
 def check_request_response(func: Route) -> tuple[bool, bool]:
     signature = inspect.signature(func)
 
@@ -138,11 +662,154 @@ def check_request_response(func: Route) -> tuple[bool, bool]:
     return request_exists, response_exists
 
 
+class Vary:
+    """A request-derived component of cache_route keys.
+
+    `header` is listed in the Vary response header. With `tag=True` entries
+    are also tagged `<name>:<value>`, so all entries for one value can be
+    invalidated at once. A `func` returning None disables caching for the
+    request. With `private=True` entries belong to a single user, so responses
+    are marked `private` and shared caches (proxies, CDNs) do not store them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Request], str | None],
+        header: str | None = None,
+        tag: bool = False,
+        private: bool = False,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.header = header
+        self.tag = tag
+        self.private = private
+
+    @classmethod
+    def from_header(cls, header: str) -> "Vary":
+        return cls(
+            f"header:{header.lower()}",
+            lambda request: request.headers.get(header, ""),
+            header=header,
+            private=header.lower() in ("authorization", "cookie"),
+        )
+
+    def tag_for(self, value: Any) -> str:
+        return f"{self.name}:{value}"
+
+
+class RouteRequest(NamedTuple):
+    """A request to a cache_route: its entry and how to compute it."""
+
+    request: Request
+    response: Response
+    template: str
+    cache: CacheHandler
+    sub_key: str
+    compute: Callable[[], Awaitable[Result]]
+
+    @property
+    def cache_key(self) -> str:
+        return self.cache._cache_key(self.sub_key)
+
+
 class cache_route:
-    def __init__(self, expire: int = 5 * 60) -> None:
+    """Cache GET responses of a route in Redis.
+
+    By default the endpoint's return value is cached and FastAPI renders it on
+    every hit. With `render=True` the fully rendered body is cached instead,
+    together with its status, headers and a strong ETag, and hits are served
+    as raw bytes. With `precompress=True` as well, the body is also stored
+    in every available content encoding, and hits are sent in the one the
+    client prefers without being compressed again.
+
+    Concurrent misses for the same key within a worker share one call to the
+    endpoint. With `lock=True` a Redis lock additionally makes a single worker
+    cluster-wide recompute the entry while the others poll the cache for up to
+    `lock_timeout` seconds.
+
+    Entries are kept for `stale` more seconds after they expire. During that
+    window the stale value is served and refreshed in the background. With
+    `beta > 0` fresh entries are also refreshed early with XFetch probability,
+    using this worker's moving average of the endpoint's recompute time. A
+    refresh calls the endpoint again with the arguments of the request that
+    triggered it, after that request is over, so endpoints of such routes may
+    only take path, query, header, cookie and body parameters.
+
+    Keys are built from the path, language and query string, plus one
+    component per `vary` entry: header names or Vary instances such as
+    `vary_by_user`.
+
+    `warm` lists the query strings that scripts/warm_cache.py requests for
+    every locale before the app takes traffic. Routes with path parameters or
+    `vary` entries are not warmed.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(
+        self,
+        expire: int = 5 * 60,
+        render: bool = False,
+        precompress: bool = False,
+        lock: bool = False,
+        lock_timeout: float = settings.CACHE_LOCK_TIMEOUT,
+        stale: int = 0,
+        beta: float = 0.0,
+        vary: Sequence[str | Vary] = (),
+        warm: Sequence[str] = ("",),
+    ) -> None:
+        if precompress and not render:
+            raise ValueError("precompress requires render")
         self.expire = expire
+        self.render = render
+        self.precompress = precompress
+        self.lock = lock
+        self.lock_timeout = lock_timeout
+        self.stale = stale
+        self.beta = beta
+        self.vary = [Vary.from_header(v) if isinstance(v, str) else v for v in vary]
+        self.vary_header = ", ".join(v.header for v in self.vary if v.header)
+        self.private = any(v.private for v in self.vary)
+        self.warm = warm
+        # rendered entries hold raw bytes, which not every codec supports
+        self.serializer = Serializer("pickle") if render else None
+        self.flight = SingleFlight()
+        self.delta = 0.0
+        self._refreshes: set[asyncio.Task] = set()
+
+    def cache_control(self, ttl: int) -> str:
+        if not self.stale:
+            value = f"max-age={ttl}"
+        else:
+            fresh = max(ttl - self.stale, 0)
+            value = f"max-age={fresh}, stale-while-revalidate={min(self.stale, ttl)}"
+        return f"private, {value}" if self.private else value
+
+    def is_stale(self, ttl: int) -> bool:
+        # without stale, a ttl rounded down to 0 is still an ordinary hit
+        return self.stale > 0 and ttl <= self.stale
+
+    def should_refresh(self, ttl: int) -> bool:
+        if self.is_stale(ttl):
+            Cache.stats["stale_hits"] += 1
+            return True
+        fresh = ttl - self.stale
+        if self.beta > 0 and self.delta > 0:
+            # XFetch: -delta * beta * ln(rand) >= time left before expiry
+            rand = random.random()  # noqa: S311
+            if -self.delta * self.beta * math.log(1.0 - rand) >= fresh:
+                Cache.stats["early_refreshes"] += 1
+                return True
+        return False
 
     def __call__(self, func: Route) -> Route:
+        if (self.stale or self.beta) and takes_request_state(func):
+            raise ValueError(
+                "stale and beta recompute the endpoint after its request is over, "
+                "so it must not have dependencies or take the request or response"
+            )
         request_exists, response_exists = check_request_response(func)
 
         @wraps(func)  # type: ignore
@@ -155,42 +822,187 @@ class cache_route:
             if not response_exists:
                 kwargs.pop("response")
 
-            async def run_function() -> Result:
+            async def compute() -> Result:
                 if inspect.iscoroutinefunction(func):
                     return await func(*args, **kwargs)
                 else:
                     return await run_in_threadpool(func, *args, **kwargs)
 
-            if request.method != "GET" or request.headers.get("Cache-Control") in (
-                "no-store",
-                "no-cache",
-            ):
-                return await run_function()
+            call = self.prepare(request, response, compute)
+            if call is None:
+                return await compute()
+            return await self.serve(call)
 
-            main_key = request.url.path.lower()
-            language = translation.get_language()
-            querystring = urlencode(sorted(request.query_params.items()))
-            sub_key = f"{language}_{querystring}".lower()
+        wrapper.cache_route = self  # type: ignore[attr-defined]
+        return cast(Route, wrapper)
 
-            cache = CacheHandler(main_key)
-            ret, ttl = await cache.get_with_ttl(sub_key)
+    def prepare(
+        self,
+        request: Request,
+        response: Response,
+        compute: Callable[[], Awaitable[Result]],
+    ) -> RouteRequest | None:
+        """Find the entry of a request, or None if it bypasses the cache."""
+        if request.method != "GET":
+            return None
+
+        template = getattr(request.scope.get("route"), "path", request.url.path)
+        if request.headers.get("Cache-Control") in ("no-store", "no-cache"):
+            Metrics.inc("cache_route_requests_total", route=template, result="bypass")
+            return None
+
+        main_key = request.url.path.lower()
+        language = translation.get_language()
+        querystring = urlencode(sorted(request.query_params.items()))
+        sub_key = f"{language}_{querystring}".lower()
+
+        tags = []
+        if self.vary:
+            values = [vary.func(request) for vary in self.vary]
+            if None in values:
+                Metrics.inc(
+                    "cache_route_requests_total", route=template, result="bypass"
+                )
+                return None
+
+            key = "\0".join(cast(list[str], values))
+            digest = hashlib.blake2b(key.encode(), digest_size=8)
+            sub_key = f"{sub_key}_{digest.hexdigest()}"
+            tags = [
+                vary.tag_for(value)
+                for vary, value in zip(self.vary, values, strict=True)
+                if vary.tag
+            ]
+        if self.vary_header:
+            response.headers["Vary"] = self.vary_header
+
+        cache = CacheHandler(
+            main_key, tags=tags, serializer=self.serializer, name=template
+        )
+        return RouteRequest(request, response, template, cache, sub_key, compute)
+
+    async def serve(self, call: RouteRequest) -> Result:
+        ret, ttl = await call.cache.get_with_ttl(call.sub_key)
+        if ret is not None:
+            Metrics.inc(
+                "cache_route_requests_total",
+                route=call.template,
+                result="stale" if self.is_stale(ttl) else "hit",
+            )
+            if self.should_refresh(ttl):
+                self.revalidate(call)
+            return self.respond(call, ret, ttl)
+
+        Metrics.inc("cache_route_requests_total", route=call.template, result="miss")
+        fill = self.fill_locked if self.lock else self.fill
+        filled = []
+
+        async def own_fill() -> Any:
+            filled.append(call)
+            return await fill(call)
+
+        ret = await self.flight.do(call.cache_key, own_fill)
+        if not filled and isinstance(ret, Response) and sets_cookie(ret):
+            # the response of a coalesced request, its cookies are not ours
+            ret = await render_response(
+                call.request, call.response, await call.compute()
+            )
+        return self.respond(call, ret, self.expire + self.stale)
+
+    def respond(self, call: RouteRequest, ret: Any, ttl: int) -> Result:
+        if self.render:
+            # rendered responses that were not cached, like errors, as they are
+            if isinstance(ret, CachedResponse):
+                return ret.to_response(call.request, self.cache_control(ttl))
+            return ret
 
-            if ret is not None:
-                response.headers["Cache-Control"] = f"max-age={ttl}"
-                etag = f"W/{hash(pickle.dumps(ret))}"
-                if request.headers.get("if-none-match") == etag:
-                    response.status_code = 304
-                    return response
+        response = call.response
+        response.headers["Cache-Control"] = self.cache_control(ttl)
+        etag = make_etag(pickle.dumps(ret), weak=True)
+        if etag_matches(call.request.headers.get("if-none-match"), etag):
+            response.status_code = 304
+            return response
+
+        response.headers["ETag"] = etag
+        return ret
+
+    @staticmethod
+    def cacheable(response: Response) -> bool:
+        # a cookie belongs to the client it was set for, never replay it
+        return (
+            200 <= response.status_code < 300
+            and hasattr(response, "body")
+            and not sets_cookie(response)
+        )
 
-                response.headers["ETag"] = etag
+    async def fill(self, call: RouteRequest) -> Any:
+        started = time.monotonic()
+        ret = await call.compute()
+        if self.render:
+            rendered = await render_response(call.request, call.response, ret)
+            if not self.cacheable(rendered):
+                return rendered
+            ret = CachedResponse.from_response(rendered)
+            if self.precompress:
+                ret = await ret.precompress()
+
+        elapsed = time.monotonic() - started
+        Metrics.observe("cache_route_fill_seconds", elapsed, route=call.template)
+        self.delta = elapsed if not self.delta else 0.8 * self.delta + 0.2 * elapsed
+        await call.cache.set(call.sub_key, ret, timeout=self.expire + self.stale)
+        return ret
+
+    async def fill_locked(self, call: RouteRequest) -> Any:
+        lock = CacheLock(call.cache_key, self.lock_timeout)
+        started = time.monotonic()
+
+        def record(outcome: str) -> None:
+            Cache.stats[f"lock_{outcome}"] += 1
+            Metrics.inc("cache_route_locks_total", route=call.template, outcome=outcome)
+            Metrics.observe(
+                "cache_route_lock_wait_seconds",
+                time.monotonic() - started,
+                route=call.template,
+                outcome=outcome,
+            )
+
+        acquired = await lock.acquire()
+        while not acquired and time.monotonic() - started < self.lock_timeout:
+            await asyncio.sleep(self.poll_interval)
+            ret = await call.cache.get(call.sub_key)
+            if ret is not None:
+                record("served")
                 return ret
-
-            ret = await run_function()
-            await cache.set(sub_key, ret, timeout=self.expire)
-
-            response.headers["Cache-Control"] = f"max-age={self.expire}"
-            response.headers["ETag"] = f"W/{hash(pickle.dumps(ret))}"
-
-            return ret
-
-        return cast(Route, wrapper)
+            acquired = await lock.acquire()
+        record("acquired" if acquired else "timeouts")
+
+        try:
+            return await self.fill(call)
+        finally:
+            if acquired:
+                await lock.release()
+
+    def revalidate(self, call: RouteRequest) -> None:
+        """Refresh the entry in the background, once per worker at a time."""
+        task = asyncio.create_task(
+            self.flight.do(f"{call.cache_key}:refresh", lambda: self.refresh(call))
+        )
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def refresh(self, call: RouteRequest) -> None:
+        # the request's response was already sent and may carry its headers
+        headers = {"Vary": self.vary_header} if self.vary_header else None
+        call = call._replace(response=sub_response(headers))
+        lock = CacheLock(call.cache_key, self.lock_timeout)
+        try:
+            # someone else holding the lock is already refreshing
+            if self.lock and not await lock.acquire():
+                return
+            try:
+                await self.fill(call)
+            finally:
+                if self.lock:
+                    await lock.release()
+        except Exception:
+            logger.exception(f"Failed to refresh cache entry {call.cache_key}")
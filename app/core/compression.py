@@ -0,0 +1,313 @@
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import Protocol
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import timing
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+COMPRESSIBLE_TYPES = {
+    b"application/javascript",
+    b"application/json",
+    b"application/xml",
+    b"image/svg+xml",
+}
+
+
+class Stream(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+
+class Encoding(ABC):
+    name: str
+    level: int
+    available = True
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def compressobj(self) -> Stream:
+        ...
+
+
+class GzipEncoding(Encoding):
+    name = "gzip"
+    level = 6
+
+    def compress(self, data: bytes) -> bytes:
+        stream = self.compressobj()
+        return stream.compress(data) + stream.flush()
+
+    def compressobj(self) -> Stream:
+        # wbits 31 writes a gzip header and trailer
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+
+class BrotliStream:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class BrotliEncoding(Encoding):
+    name = "br"
+    level = 4
+    available = brotli is not None
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def compressobj(self) -> Stream:
+        return BrotliStream(self.level)
+
+
+class ZstdEncoding(Encoding):
+    name = "zstd"
+    level = 3
+    available = zstandard is not None
+
+    def __init__(self) -> None:
+        # compressors must not be shared between threads
+        self._local = threading.local()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(level=self.level)
+            self._local.compressor = compressor
+        return compressor.compress(data)
+
+    def compressobj(self) -> Stream:
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+
+# in order of preference when the client accepts several equally
+ENCODINGS: dict[str, Encoding] = {
+    encoding.name: encoding
+    for encoding in (ZstdEncoding(), BrotliEncoding(), GzipEncoding())
+    if encoding.available
+}
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str) -> str | None:
+    """Pick the encoding with the highest q-value in an Accept-Encoding value.
+
+    Ties go to the order of ENCODINGS. Returns None for identity.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        name, _, value = params.strip().partition("=")
+        try:
+            qualities[coding.strip().lower()] = (
+                float(value) if name.strip() == "q" else 1.0
+            )
+        except ValueError:
+            continue
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = qualities.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(headers: Iterable[tuple[bytes, bytes]]) -> bool:
+    """Whether a response with these headers is worth compressing.
+
+    Already encoded responses, binary types, event streams and
+    `Cache-Control: no-transform` are not.
+    """
+    content_type = b""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"content-encoding":
+            return False
+        if name == b"cache-control" and b"no-transform" in value.lower():
+            return False
+        if name == b"content-type":
+            content_type = value.partition(b";")[0].strip().lower()
+    return (
+        content_type.startswith(b"text/") and content_type != b"text/event-stream"
+    ) or (
+        content_type in COMPRESSIBLE_TYPES or content_type.endswith((b"+json", b"+xml"))
+    )
+
+
+async def compress(
+    encoding: str,
+    data: bytes,
+    thread_threshold: int = settings.COMPRESSION_THREAD_THRESHOLD,
+) -> bytes:
+    """Compress `data`, in the threadpool if it is large."""
+    with timing.span("compress"):
+        if len(data) >= thread_threshold:
+            return await run_in_threadpool(ENCODINGS[encoding].compress, data)
+        return ENCODINGS[encoding].compress(data)
+
+
+async def compress_chunk(
+    stream: Stream,
+    data: bytes,
+    flush: bool,
+    thread_threshold: int = settings.COMPRESSION_THREAD_THRESHOLD,
+) -> bytes:
+    """Compress a chunk of a streamed body, in the threadpool if it is large."""
+
+    def run() -> bytes:
+        body = stream.compress(data)
+        return body + stream.flush() if flush else body
+
+    with timing.span("compress"):
+        if len(data) >= thread_threshold:
+            return await run_in_threadpool(run)
+        return run()
+
+
+def vary_on_encoding(
+    headers: Iterable[tuple[bytes, bytes]],
+) -> list[tuple[bytes, bytes]]:
+    ret = []
+    vary = False
+    for name, value in headers:
+        if name.lower() == b"vary":
+            vary = True
+            if b"accept-encoding" not in value.lower():
+                value += b", Accept-Encoding"
+        ret.append((name, value))
+    if not vary:
+        ret.append((b"vary", b"Accept-Encoding"))
+    return ret
+
+
+def encoded_headers(
+    headers: Iterable[tuple[bytes, bytes]], encoding: str, length: int | None
+) -> list[tuple[bytes, bytes]]:
+    """Headers of a response after encoding its body.
+
+    Strong ETags become weak, as the encoded body is not byte-identical, and
+    Accept-Encoding is added to Vary.
+    """
+    ret = [(b"content-encoding", encoding.encode())]
+    if length is not None:
+        ret.append((b"content-length", str(length).encode()))
+    for name, value in headers:
+        lower = name.lower()
+        if lower == b"content-length":
+            continue
+        if lower == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        ret.append((name, value))
+    return vary_on_encoding(ret)
+
+
+class CompressionMiddleware:
+    """Compress responses with the best encoding the client accepts.
+
+    Bodies shorter than `minimum_size` and responses that are not
+    `compressible` pass through, so do precompressed cache_route hits. Streamed
+    bodies are compressed chunk by chunk. Bodies and chunks of
+    `thread_threshold` bytes or more are compressed in the threadpool.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = settings.COMPRESSION_MINIMUM_SIZE,
+        thread_threshold: int = settings.COMPRESSION_THREAD_THRESHOLD,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_threshold = thread_threshold
+
+    @staticmethod
+    def get_encoding(scope: Scope) -> str | None:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                return negotiate(value.decode("latin-1"))
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = self.get_encoding(scope)
+        if accepted is None:
+            await self.app(scope, receive, send)
+            return
+        # bound after the check so that send_compressed sees a str
+        encoding = accepted
+
+        start: Message | None = None
+        stream: Stream | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                if compressible(message.get("headers", ())):
+                    # wait for the body to decide
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and stream is not None:
+                message["body"] = await compress_chunk(
+                    stream,
+                    message.get("body", b""),
+                    not message.get("more_body", False),
+                    self.thread_threshold,
+                )
+            elif message["type"] == "http.response.body" and start is not None:
+                stream = await self.encode_first(encoding, start, message)
+                await send(start)
+                start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def encode_first(
+        self, encoding: str, start: Message, message: Message
+    ) -> Stream | None:
+        """Encode the first body message, returning the stream for the rest."""
+        body = message.get("body", b"")
+        headers = start.get("headers", ())
+        if message.get("more_body", False):
+            stream = ENCODINGS[encoding].compressobj()
+            message["body"] = await compress_chunk(
+                stream, body, False, self.thread_threshold
+            )
+            start["headers"] = encoded_headers(headers, encoding, None)
+            return stream
+        if len(body) >= self.minimum_size:
+            body = await compress(encoding, body, self.thread_threshold)
+            message["body"] = body
+            start["headers"] = encoded_headers(headers, encoding, len(body))
+        return None
@@ -2,7 +2,15 @@ from datetime import timedelta
 from enum import IntEnum
 from pathlib import Path
 
-from pydantic import AnyHttpUrl, AnyUrl, BaseSettings, EmailStr, RedisDsn, validator
+from pydantic import (
+    AnyHttpUrl,
+    AnyUrl,
+    BaseSettings,
+    EmailStr,
+    IPvAnyNetwork,
+    RedisDsn,
+    validator,
+)
 
 
 class Environment(IntEnum):
@@ -23,6 +31,8 @@ class Settings(BaseSettings):
     PROJECT_NAME: str
     SECRET_KEY: str
     ALLOWED_HOSTS: list[str] = []
+    # proxies whose X-Forwarded-For entries are believed, e.g. the load balancer
+    TRUSTED_PROXIES: list[IPvAnyNetwork] = []
     CORS_ORIGINS: list[AnyHttpUrl] = []
     SERVER_URL: AnyHttpUrl
     CLIENT_URL: AnyHttpUrl
@@ -48,7 +58,57 @@ class Settings(BaseSettings):
             path=f"/{self.POSTGRES_DB}",
         )
 
-    CACHE_URI: RedisDsn
+    CACHE_BACKEND: str = "redis"
+    CACHE_URI: RedisDsn | None
+    CACHE_SHARD_URIS: list[RedisDsn] = []
+    CACHE_MAX_CONNECTIONS: int = 64
+    CACHE_SOCKET_TIMEOUT: float = 2.0
+    CACHE_SOCKET_CONNECT_TIMEOUT: float = 2.0
+    CACHE_HEALTH_CHECK_INTERVAL: int = 30
+    CACHE_RETRIES: int = 2
+    CACHE_LOCAL_SIZE: int = 0
+    CACHE_LOCAL_TTL: int = 5
+    CACHE_CODEC: str = "pickle"
+    CACHE_COMPRESSION: str = ""
+    CACHE_COMPRESSION_THRESHOLD: int = 1024
+    CACHE_LOCK_TIMEOUT: float = 5.0
+    # latency budgets of a single cache and rate limiter call, in seconds
+    CACHE_CALL_TIMEOUT: float = 0.1
+    RATE_LIMIT_CALL_TIMEOUT: float = 0.05
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RECOVERY_TIME: float = 5.0
+
+    # share of a limit each worker reserves at once, 0 checks every request
+    RATE_LIMIT_LOCAL_ERROR: float = 0.1
+    RATE_LIMIT_SYNC_INTERVAL: float = 1.0
+
+    # responses are compressed from the minimum size on, and in the
+    # threadpool from the thread threshold on
+    COMPRESSION_MINIMUM_SIZE: int = 500
+    COMPRESSION_THREAD_THRESHOLD: int = 64 * 1024
+
+    # concurrent requests per worker, adapted within the bounds from latency,
+    # and the requests that may wait for a slot, for up to the timeout
+    ADMISSION_LIMIT: int = 100
+    ADMISSION_MIN_LIMIT: int = 10
+    ADMISSION_MAX_LIMIT: int = 1000
+    ADMISSION_QUEUE_SIZE: int = 50
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5
+    ADMISSION_RETRY_AFTER: int = 1
+
+    LOG_LEVEL: str = "INFO"
+    # records waiting for the log writer thread, more are dropped
+    LOG_QUEUE_SIZE: int = 10000
+    # share of requests with a status below 400 in the access log
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0
+
+    # send Server-Timing to every client, not only superusers
+    SERVER_TIMING: bool = False
+    # requests slower than this many seconds are logged with their timings
+    SLOW_REQUEST_THRESHOLD: float = 1.0
+
+    METRICS_TOKEN: str = ""
+    METRICS_FLUSH_INTERVAL: float = 10.0
 
     ACCESS_TOKEN_EXPIRE: timedelta = timedelta(hours=1)
     REFRESH_TOKEN_EXPIRE: timedelta = timedelta(days=30)
@@ -84,6 +144,7 @@ settings = Settings()  # type: ignore
 
 if settings.ENVIRONMENT == Environment.test:
     settings.POSTGRES_DB = "test"
+    settings.CACHE_BACKEND = "memory"
 
 
 TORTOISE_CONFIG = {
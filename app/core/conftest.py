@@ -0,0 +1,12 @@
+import pytest
+
+from app.core.backends import MemoryBackend
+from app.core.cache import Cache
+
+
+@pytest.fixture
+def memory_backend(monkeypatch: pytest.MonkeyPatch) -> MemoryBackend:
+    backend = MemoryBackend()
+    monkeypatch.setattr(Cache, "backend", backend)
+    monkeypatch.setattr(Cache, "local", None)
+    return backend
@@ -1,10 +1,11 @@
-from ipaddress import IPv4Address, IPv6Address
+from ipaddress import IPv4Address, IPv6Address, ip_address
 
 from fastapi import Depends, Request
 from geoip2.records import City, Continent, Country
 from user_agents import parse
 from user_agents.parsers import UserAgent
 
+from app.core.config import settings
 from app.utils.geolocation import GeoIP2
 
 IPAddress = IPv4Address | IPv6Address
@@ -14,12 +15,27 @@ def get_user_agent(request: Request) -> UserAgent:
     return parse(request.headers["User-Agent"])
 
 
-def get_ip_string(request: Request) -> str | None:
-    x_forwarded_for = request.headers.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        return x_forwarded_for.split(",")[0]
+def is_trusted_proxy(ip_string: str) -> bool:
+    try:
+        address = ip_address(ip_string)
+    except ValueError:
+        return False
+    return any(address in network for network in settings.TRUSTED_PROXIES)
 
-    return request.headers.get("REMOTE_ADDR")
+
+def get_ip_string(request: Request) -> str | None:
+    client = request.client.host if request.client else None
+    if client is None or not is_trusted_proxy(client):
+        return client
+
+    # each proxy appends the address it got the request from, so the client is
+    # the last entry not added by one of ours; anything left of it is spoofable
+    x_forwarded_for = request.headers.get("X-Forwarded-For", "")
+    hops = [hop.strip() for hop in x_forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else client
 
 
 def get_ip_address(ip_string: str = Depends(get_ip_string)) -> IPAddress:
@@ -8,16 +8,19 @@ from httpx import Response as httpxResponse
 from sentry_sdk import capture_exception
 from starlette.exceptions import HTTPException
 
+from app.core.translation import LazyString
+
 
 class ApiException(Exception):
     name: str
 
     def __init__(
         self,
-        message: str = "",
+        message: str | LazyString = "",
         status_code: int = 400,
         app: str | None = None,
         code: str | None = None,
+        headers: dict[str, str] | None = None,
     ) -> None:
         super().__init__(message)
         if not app:
@@ -27,6 +30,7 @@ class ApiException(Exception):
         self.message = message
         self.status_code = status_code
         self.app = app
+        self.headers = headers
         if code:
             self.name = code
 
@@ -40,7 +44,7 @@ class ApiException(Exception):
 
         return (
             self.error_code == other.error_code
-            and self.message == other.message
+            and str(self.message) == str(other.message)
             and self.status_code == other.status_code
         )
 
@@ -49,8 +53,11 @@ class ApiException(Exception):
 
     def to_response(self) -> ORJSONResponse:
         return ORJSONResponse(
-            humps.camelize({"error_code": self.error_code, "message": self.message}),
+            humps.camelize(
+                {"error_code": self.error_code, "message": str(self.message)}
+            ),
             status_code=self.status_code,
+            headers=self.headers,
         )
 
     @classmethod
@@ -1,30 +1,248 @@
 import math
+import time
+from collections.abc import Callable, Collection, Sequence
+from functools import partial
+from typing import NamedTuple
 
-from fastapi import Depends, HTTPException, Request, status
-from redis.commands.core import AsyncScript
+from fastapi import Depends, Request, Response
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.core.cache import Cache
+from app.core import timing
+from app.core.backends import MemoryBackend
+from app.core.breaker import CircuitBreaker
+from app.core.cache import Cache, LocalCache
+from app.core.config import settings
 from app.core.deps import get_ip_string
+from app.core.exceptions import ApiException
+
+# Every script takes KEYS[1] and ARGV = (limit, window in ms, cost), grants as
+# many of the `cost` units as fit and returns {granted, remaining, reset ms,
+# retry after ms}. Time is read from the server so that all workers agree on it.
+
+_NOW = """local time = redis.call("TIME")
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+"""
+
+
+def _now() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _escape_braces(value: str) -> str:
+    return value.replace("{", "(").replace("}", ")")
+
+
+def _fixed_window(backend: MemoryBackend, keys: list[str], args: list[str]) -> list:
+    key, limit, window, cost = keys[0], int(args[0]), int(args[1]), int(args[2])
+    granted = min(cost, limit - int(backend.get_value(key) or 0))
+    if granted <= 0:
+        pttl = backend.pttl(key)
+        return [0, 0, pttl, pttl]
+    current = backend.incr(key, granted)
+    if current == granted:
+        backend.expire(key, window / 1000)
+    return [granted, limit - current, backend.pttl(key), 0]
+
+
+def _sliding_log(backend: MemoryBackend, keys: list[str], args: list[str]) -> list:
+    key, limit, window, cost = keys[0], int(args[0]), int(args[1]), int(args[2])
+    now = _now()
+    log = [at for at in backend.get_value(key) or () if at > now - window]
+    granted = min(cost, limit - len(log))
+    if granted <= 0:
+        backend.set_value(key, log, (log[-1] + window - now) / 1000)
+        return [0, 0, log[-1] + window - now, log[0] + window - now]
+    log.extend([now] * granted)
+    backend.set_value(key, log, window / 1000)
+    return [granted, limit - len(log), window, 0]
+
+
+def _sliding_window(backend: MemoryBackend, keys: list[str], args: list[str]) -> list:
+    key, limit, window, cost = keys[0], int(args[0]), int(args[1]), int(args[2])
+    index, elapsed = divmod(_now(), window)
+    counts = backend.get_value(key) or {}
+    current, previous = counts.get(index, 0), counts.get(index - 1, 0)
+    available = math.floor(limit - previous * (window - elapsed) / window - current)
+    granted = min(cost, available)
+    if granted <= 0:
+        if current + 1 > limit or previous == 0:
+            retry = window - elapsed
+        else:
+            retry = math.ceil(window - (limit - 1 - current) * window / previous)
+            retry -= elapsed
+        return [0, 0, 2 * window - elapsed, max(retry, 1)]
+    counts = {index - 1: previous, index: current + granted}
+    backend.set_value(key, counts, (2 * window - elapsed) / 1000)
+    return [granted, available - granted, 2 * window - elapsed, 0]
+
+
+def _gcra(backend: MemoryBackend, keys: list[str], args: list[str]) -> list:
+    # in microseconds, so that the emission interval is exact enough as an integer
+    key, limit, window, cost = keys[0], int(args[0]), int(args[1]) * 1000, int(args[2])
+    now = _now() * 1000
+    interval = window // limit
+    tat = max(int(backend.get_value(key) or now), now)
+    available = (now + window - tat) // interval
+    granted = min(cost, available)
+    if granted <= 0:
+        retry = tat + interval - window - now
+        return [0, 0, math.ceil((tat - now) / 1000), math.ceil(retry / 1000)]
+    new_tat = tat + granted * interval
+    backend.set_value(key, new_tat, (new_tat - now) / 1_000_000)
+    return [granted, available - granted, math.ceil((new_tat - now) / 1000), 0]
+
+
+class RateLimit(NamedTuple):
+    limit: int
+    remaining: int
+    reset: int  # ms until the whole quota is available again
+    retry_after: int  # ms until the next request is allowed, 0 if this one was
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset / 1000)),
+        }
+        if self.retry_after:
+            headers["Retry-After"] = str(math.ceil(self.retry_after / 1000))
+        return headers
+
+    @property
+    def raw_headers(self) -> list[tuple[bytes, bytes]]:
+        return [(k.lower().encode(), v.encode()) for k, v in self.headers.items()]
 
 
 class RateLimiter:
-    script_str = """local key = KEYS[1]
+    """Limit requests per client and route to `times` in the given period.
+
+    Algorithms:
+    - fixed_window: a counter per period, allows up to twice the limit in a
+      burst across the edge of two periods
+    - sliding_log: a timestamp per request, exact but stores `times` entries
+    - sliding_window: counters of the current and previous period, weighted by
+      how much of the previous one still overlaps the sliding period
+    - gcra: a single timestamp in microseconds, spreads requests evenly while
+      still allowing a burst of `times`
+
+    With a `local_error` above zero, each worker reserves `times * local_error`
+    units per key at once and spends them without asking Redis, so only one
+    request in a batch pays the round trip. Unspent units are dropped after
+    `sync_interval` seconds, and a worker may spend its units up to that long
+    after reserving them, so a period can be off by at most workers * batch.
+    Rejections are remembered for the same time.
+
+    Keys are per client IP, or per user if `by_user` returns the id of an
+    authenticated user, and per route template rather than path, so the
+    number of keys does not grow with path parameters.
+    """
+
+    local_size = 10000
+    # while the backend is slow or down every request is allowed
+    breaker = CircuitBreaker(
+        "limiter",
+        settings.RATE_LIMIT_CALL_TIMEOUT,
+        settings.BREAKER_FAILURE_THRESHOLD,
+        settings.BREAKER_RECOVERY_TIME,
+    )
+
+    scripts = {
+        "fixed_window": Cache.register_script(
+            """local key = KEYS[1]
 local limit = tonumber(ARGV[1])
-local expire_time = ARGV[2]
-local current = tonumber(redis.call('get', key) or "0")
-if current > 0 then
-  if current + 1 > limit then
-    return redis.call("PTTL",key)
-  else
-    redis.call("INCR", key)
-    return 0
+local cost = tonumber(ARGV[3])
+local granted = math.min(cost, limit - tonumber(redis.call("GET", key) or "0"))
+if granted <= 0 then
+  local pttl = redis.call("PTTL", key)
+  return {0, 0, pttl, pttl}
+end
+local current = redis.call("INCRBY", key, granted)
+if current == granted then
+  redis.call("PEXPIRE", key, ARGV[2])
+end
+return {granted, limit - current, redis.call("PTTL", key), 0}""",
+            _fixed_window,
+        ),
+        "sliding_log": Cache.register_script(
+            _NOW
+            + """local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+redis.call("ZREMRANGEBYSCORE", key, "-inf", now - window)
+local count = redis.call("ZCARD", key)
+local granted = math.min(cost, limit - count)
+if granted <= 0 then
+  local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")
+  local newest = redis.call("ZRANGE", key, -1, -1, "WITHSCORES")
+  return {0, 0, newest[2] + window - now, oldest[2] + window - now}
+end
+local entries = {}
+for i = 1, granted do
+  entries[#entries + 1] = now
+  entries[#entries + 1] = now .. ":" .. (count + i)
+end
+redis.call("ZADD", key, unpack(entries))
+redis.call("PEXPIRE", key, window)
+return {granted, limit - count - granted, window, 0}""",
+            _sliding_log,
+        ),
+        "sliding_window": Cache.register_script(
+            _NOW
+            + """local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local index = math.floor(now / window)
+local elapsed = now - index * window
+local counts = redis.call("HMGET", key, index, index - 1)
+local current = tonumber(counts[1] or "0")
+local previous = tonumber(counts[2] or "0")
+local available = math.floor(
+  limit - previous * (window - elapsed) / window - current
+)
+local granted = math.min(cost, available)
+if granted <= 0 then
+  local retry = window - elapsed
+  if current + 1 <= limit and previous > 0 then
+    retry = math.ceil(window - (limit - 1 - current) * window / previous) - elapsed
   end
-else
-  redis.call("SET", key, 1,"px",expire_time)
-  return 0
-end"""
-
-    script: AsyncScript = Cache.register_script(script_str)
+  return {0, 0, 2 * window - elapsed, math.max(retry, 1)}
+end
+if current == 0 then
+  -- first request of the period, drop the counters of older ones
+  redis.call("DEL", key)
+  redis.call("HSET", key, index - 1, previous)
+end
+redis.call("HINCRBY", key, index, granted)
+redis.call("PEXPIRE", key, 2 * window - elapsed)
+return {granted, available - granted, 2 * window - elapsed, 0}""",
+            _sliding_window,
+        ),
+        "gcra": Cache.register_script(
+            """local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000
+local cost = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = time[1] * 1000000 + time[2]
+local interval = math.floor(window / limit)
+local tat = math.max(tonumber(redis.call("GET", key) or now), now)
+local available = math.floor((now + window - tat) / interval)
+local granted = math.min(cost, available)
+if granted <= 0 then
+  local retry = tat + interval - window - now
+  return {0, 0, math.ceil((tat - now) / 1000), math.ceil(retry / 1000)}
+end
+local new_tat = tat + granted * interval
+local px = math.ceil((new_tat - now) / 1000)
+redis.call("SET", key, string.format("%d", new_tat), "PX", px)
+return {granted, available - granted, px, 0}""",
+            _gcra,
+        ),
+    }
 
     def __init__(
         self,
@@ -33,24 +251,162 @@ end"""
         seconds: int = 0,
         minutes: int = 0,
         hours: int = 0,
+        algorithm: str = "fixed_window",
+        local_error: float | None = None,
+        sync_interval: float | None = None,
+        by_user: Callable[[Request], str | None] | None = None,
     ) -> None:
+        if algorithm not in self.scripts:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
         self.times = times
         self.milliseconds = (
             milliseconds + 1000 * seconds + 60000 * minutes + 3600000 * hours
         )
+        self.algorithm = algorithm
+        self.script = self.scripts[algorithm]
+        self.by_user = by_user
+        if local_error is None:
+            local_error = settings.RATE_LIMIT_LOCAL_ERROR
+        if sync_interval is None:
+            sync_interval = settings.RATE_LIMIT_SYNC_INTERVAL
+        self.batch = math.floor(times * local_error)
+        # reserved units and the last result from Redis, per key
+        self.local: LocalCache | None = (
+            LocalCache(self.local_size, sync_interval) if self.batch > 1 else None
+        )
+
+    async def _reserve(self, key: str, cost: int) -> tuple[int, RateLimit]:
+        args = [str(self.times), str(self.milliseconds), str(cost)]
+        with timing.span("limiter"):
+            ret = await self.breaker.call(partial(self.script, [key], args), None)
+        if ret is None:
+            return cost, RateLimit(self.times, self.times - cost, 0, 0)
+        granted, remaining, reset, retry_after = ret
+        rate_limit = RateLimit(self.times, int(remaining), int(reset), int(retry_after))
+        return int(granted), rate_limit
+
+    async def hit(self, key: str) -> RateLimit:
+        if self.local is None:
+            return (await self._reserve(key, 1))[1]
+
+        cached = self.local.get(key)
+        if cached is not None:
+            reservation = cached[0]
+            tokens, rate_limit = reservation
+            if rate_limit.retry_after:
+                return rate_limit
+            if tokens > 0:
+                reservation[0] = tokens - 1
+                return rate_limit._replace(remaining=rate_limit.remaining + tokens - 1)
+
+        granted, rate_limit = await self._reserve(key, self.batch)
+        if granted:
+            self.local.set(key, [granted - 1, rate_limit], -1)
+            return rate_limit._replace(remaining=rate_limit.remaining + granted - 1)
+        self.local.set(key, [0, rate_limit], rate_limit.retry_after / 1000)
+        return rate_limit
 
     async def _check(self, key: str) -> int:
-        return await self.script([key], [str(self.times), str(self.milliseconds)])
+        return (await self.hit(key)).retry_after
+
+    def key_for(
+        self, request: Request, ip_string: str | None, route: str | None = None
+    ) -> str:
+        """The key of a client's bucket for a route.
+
+        The client is the key's hash tag, so the buckets spread over shards and
+        cluster nodes by client. Braces in the route template and client are
+        replaced so that they cannot become the hash tag instead.
+        """
+        user_id = self.by_user(request) if self.by_user else None
+        client = f"user:{user_id}" if user_id else f"ip:{ip_string}"
+        if route is None:
+            route = getattr(request.scope.get("route"), "path", request.url.path)
+        client, route = _escape_braces(client), _escape_braces(route)
+        return f"limiter:{{{client}}}:{self.algorithm}:{request.method}:{route}"
 
     async def __call__(
-        self, request: Request, ip_string: str = Depends(get_ip_string)
+        self,
+        request: Request,
+        response: Response,
+        ip_string: str | None = Depends(get_ip_string),
     ) -> None:
-        key = f"limiter:{ip_string}:{request.method}:{request.url.path}"
-        pexpire = await self._check(key)
-        if pexpire != 0:
-            expire = math.ceil(pexpire / 1000)
-            raise HTTPException(
-                status.HTTP_429_TOO_MANY_REQUESTS,
+        rate_limit = await self.hit(self.key_for(request, ip_string))
+        if rate_limit.retry_after:
+            raise ApiException(
                 "Too Many Requests",
-                headers={"Retry-After": str(expire)},
+                429,
+                "app",
+                "too_many_requests",
+                headers=rate_limit.headers,
             )
+        response.headers.update(rate_limit.headers)
+
+
+class RateLimitRule:
+    """A limiter for requests whose path matches a route template like
+    `/api/v1/users/{id}`, optionally only for some methods."""
+
+    def __init__(
+        self,
+        path: str,
+        limiter: RateLimiter,
+        methods: Collection[str] | None = None,
+    ) -> None:
+        self.path = path
+        self.limiter = limiter
+        self.methods = {method.upper() for method in methods} if methods else None
+        self.regex = compile_path(path)[0]
+
+    def matches(self, scope: Scope) -> bool:
+        if self.methods is not None and scope["method"] not in self.methods:
+            return False
+        return self.regex.match(scope["path"]) is not None
+
+
+class RateLimitMiddleware:
+    """Apply the first matching rule to each request before routing.
+
+    Rejected requests get a 429 built once up front and never reach routing,
+    dependencies or body parsing. Add it inside CORSMiddleware, so that CORS
+    headers are added to the 429 and preflights are not counted.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[RateLimitRule]) -> None:
+        self.app = app
+        self.rules = rules
+        response = ApiException(
+            "Too Many Requests", 429, "app", "too_many_requests"
+        ).to_response()
+        self.body = response.body
+        self.headers = response.raw_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = None
+        if scope["type"] == "http":
+            rule = next((rule for rule in self.rules if rule.matches(scope)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        key = rule.limiter.key_for(request, get_ip_string(request), rule.path)
+        rate_limit = await rule.limiter.hit(key)
+        headers = rate_limit.raw_headers
+        if rate_limit.retry_after:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [*self.headers, *headers],
+                }
+            )
+            await send({"type": "http.response.body", "body": self.body})
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
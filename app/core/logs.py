@@ -0,0 +1,128 @@
+import atexit
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+import aiohttp
+import orjson
+
+from app.core.config import Environment, settings
+from app.core.metrics import Metrics
+
+request_id: ContextVar[str] = ContextVar[str]("request_id", default="")
+
+# attributes every LogRecord has, anything else was passed in `extra`
+RECORD_ATTRS = {
+    *logging.LogRecord("", 0, "", 0, "", None, None).__dict__,
+    "message",
+    "asctime",
+    "request_id",
+}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", ""),
+        }
+        data.update(
+            (key, value)
+            for key, value in record.__dict__.items()
+            if key not in RECORD_ATTRS
+        )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return orjson.dumps(data, default=str).decode()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hand records to the listener thread, dropping them if it falls behind."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # keep the traceback apart from the message for the JSON formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            Metrics.inc("log_records_dropped_total")
+
+
+def setup_logging() -> None:
+    """Send all log records through a queue to a thread writing to stdout.
+
+    Records are formatted as JSON outside local. Uvicorn's access log is
+    replaced by AccessLogMiddleware.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    if settings.ENVIRONMENT > Environment.local:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(levelname)s [%(request_id)s] %(name)s: %(message)s")
+        )
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestIdFilter())
+    listener = QueueListener(queue_handler.queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").handlers = []
+    logging.getLogger("uvicorn.access").propagate = False
+
+
+def sentry_before_send(event: dict[str, Any], hint: dict[str, Any]) -> dict[str, Any]:
+    """Tag Sentry events with the id of the request they happened in."""
+    rid = request_id.get()
+    if rid:
+        event.setdefault("tags", {})["request_id"] = rid
+    return event
+
+
+async def _on_request_start(
+    session: aiohttp.ClientSession,
+    context: Any,
+    params: aiohttp.TraceRequestStartParams,
+) -> None:
+    rid = request_id.get()
+    if rid:
+        params.headers.setdefault("X-Request-ID", rid)
+
+
+request_id_trace = aiohttp.TraceConfig()
+request_id_trace.on_request_start.append(_on_request_start)
+
+
+def client_session(**kwargs: Any) -> aiohttp.ClientSession:
+    """An aiohttp session that forwards the current request id."""
+    return aiohttp.ClientSession(trace_configs=[request_id_trace], **kwargs)
@@ -0,0 +1,225 @@
+import hmac
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi import Header
+
+from app.core.backends import Backend, MemoryBackend, Script
+from app.core.config import settings
+from app.core.exceptions import ApiException
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {
+    "cache_lookups_total": ("counter", "Cache lookups by tier and result."),
+    "cache_backend_seconds": ("histogram", "Latency of cache backend calls."),
+    "cache_value_bytes": ("histogram", "Size of serialized values written."),
+    "cache_route_requests_total": (
+        "counter",
+        "Requests to cached routes by result: hit, stale, miss or bypass.",
+    ),
+    "cache_route_fill_seconds": (
+        "histogram",
+        "Time to compute a cached route's response on a miss or refresh.",
+    ),
+    "cache_route_locks_total": ("counter", "Lock outcomes of cached routes."),
+    "cache_route_lock_wait_seconds": (
+        "histogram",
+        "Time cached routes waited for the recompute lock, by outcome.",
+    ),
+    "admission_shed_total": (
+        "counter",
+        "Requests shed by admission control because the queue was full or they "
+        "waited too long.",
+    ),
+    "log_records_dropped_total": (
+        "counter",
+        "Log records dropped because the log writer thread fell behind.",
+    ),
+    "circuit_breaker_transitions_total": (
+        "counter",
+        "Circuit breaker state changes to open, half_open or closed.",
+    ),
+    "circuit_breaker_fallbacks_total": (
+        "counter",
+        "Calls answered with their fallback because of a timeout, an error or "
+        "an open circuit.",
+    ),
+}
+
+route_label: ContextVar[str] = ContextVar[str]("route_label", default="")
+
+
+def _incr_hash(backend: MemoryBackend, keys: list[str], args: list[str]) -> Any:
+    for field, amount in zip(args[::2], args[1::2], strict=True):
+        backend.hincrbyfloat(keys[0], field, float(amount))
+
+
+def _get_hash(backend: MemoryBackend, keys: list[str], args: list[str]) -> Any:
+    return [
+        item.encode()
+        for field, value in backend.hgetall(keys[0]).items()
+        for item in (field, repr(value))
+    ]
+
+
+incr_hash = Script(
+    """for i = 1, #ARGV, 2 do
+  redis.call("HINCRBYFLOAT", KEYS[1], ARGV[i], ARGV[i + 1])
+end""",
+    _incr_hash,
+)
+get_hash = Script('return redis.call("HGETALL", KEYS[1])', _get_hash)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _series(name: str, labels: dict[str, Any]) -> str:
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return f"{name}{{{pairs}}}"
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _histogram(name: str, samples: dict[str, float]) -> list[str]:
+    # buckets are stored per bound and only made cumulative here
+    prefix = f"{name}_bucket{{"
+    buckets: dict[str, list[tuple[float, float]]] = {}
+    for series, value in samples.items():
+        if series.startswith(prefix):
+            labels, _, le = series[len(prefix) : -2].rpartition('le="')
+            buckets.setdefault(labels, []).append((float(le), value))
+
+    lines = []
+    for series, count in sorted(samples.items()):
+        if series.partition("{")[0] != f"{name}_count":
+            continue
+        selector = series[len(f"{name}_count") :]
+        labels = f"{selector[1:-1]}," if selector else ""
+        total = 0.0
+        for bound, value in sorted(buckets.get(labels, ())):
+            total += value
+            lines.append(f'{prefix}{labels}le="{_format(bound)}"}} {_format(total)}')
+        lines.append(f'{prefix}{labels}le="+Inf"}} {_format(count)}')
+        lines.append(
+            f"{name}_sum{selector} {_format(samples[f'{name}_sum{selector}'])}"
+        )
+        lines.append(f"{series} {_format(count)}")
+    return lines
+
+
+class Metrics:
+    """Prometheus style counters and histograms shared by all workers.
+
+    Each worker accumulates increments locally and periodically adds them to a
+    single hash in the cache backend, so the exposition shows totals for every
+    gunicorn worker whichever one serves the scrape.
+    """
+
+    key = "metrics"
+    _pending: defaultdict[str, float] = defaultdict(float)
+
+    @classmethod
+    def inc(cls, name: str, amount: float = 1, **labels: Any) -> None:
+        cls._pending[_series(name, labels)] += amount
+
+    @classmethod
+    def observe(
+        cls,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        **labels: Any,
+    ) -> None:
+        # only the smallest matching bucket, values above all go to +Inf only
+        for bound in buckets:
+            if value <= bound:
+                cls.inc(f"{name}_bucket", **labels, le=bound)
+                break
+        cls.inc(f"{name}_sum", value, **labels)
+        cls.inc(f"{name}_count", **labels)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, time.perf_counter() - started, **labels)
+
+    @classmethod
+    async def flush(cls, backend: Backend) -> None:
+        pending, cls._pending = cls._pending, defaultdict(float)
+        if not pending:
+            return
+        args = [item for series, amount in pending.items() for item in (series, amount)]
+        try:
+            await backend.run_script(incr_hash, [cls.key], args)
+        except Exception:
+            # keep the increments for the next flush
+            for series, amount in pending.items():
+                cls._pending[series] += amount
+            raise
+
+    @classmethod
+    async def collect(cls, backend: Backend) -> dict[str, float]:
+        await cls.flush(backend)
+        items = await backend.run_script(get_hash, [cls.key], [])
+        return {
+            field.decode(): float(value)
+            for field, value in zip(items[::2], items[1::2], strict=True)
+        }
+
+    @classmethod
+    async def render(cls, backend: Backend) -> str:
+        samples = await cls.collect(backend)
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            if kind == "histogram":
+                series = _histogram(name, samples)
+            else:
+                series = [
+                    f"{key} {_format(value)}"
+                    for key, value in sorted(samples.items())
+                    if key.partition("{")[0] == name
+                ]
+            if series:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(series)
+        return "\n".join(lines) + "\n"
+
+
+def verify_metrics_token(authorization: str = Header("")) -> None:
+    expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(
+        authorization.encode(), expected
+    ):
+        # hide the endpoint unless a valid token is configured and sent
+        raise ApiException("Not Found", 404, "app", "not_found")
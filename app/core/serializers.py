@@ -0,0 +1,202 @@
+import pickle
+from abc import ABC, abstractmethod
+from datetime import date, time
+from functools import cache
+from typing import Any
+from uuid import UUID
+
+import orjson
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+# Values written before the header byte existed are bare pickles, which always
+# start with the PROTO opcode. Header bytes stay below it, so both can coexist.
+PICKLE_PROTO = 0x80
+
+
+class SerializerException(Exception):
+    pass
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, set | frozenset | tuple):
+        return list(obj)
+    if isinstance(obj, date | time):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Type is not serializable: {type(obj)}")
+
+
+class Codec(ABC):
+    id: int
+    name: str
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        ...
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        ...
+
+
+class PickleCodec(Codec):
+    id = 1
+    name = "pickle"
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)  # noqa: S301
+
+
+class OrjsonCodec(Codec):
+    id = 2
+    name = "orjson"
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    id = 3
+    name = "msgpack"
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise SerializerException("msgpack is not installed, see the msgpack extra")
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_default, datetime=False)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, strict_map_key=False)
+
+
+class Compressor(ABC):
+    id: int
+    name: str
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class ZstdCompressor(Compressor):
+    id = 1
+    name = "zstd"
+
+    def __init__(self, level: int = 3) -> None:
+        if zstandard is None:
+            raise SerializerException("zstandard is not installed, see the zstd extra")
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    id = 2
+    name = "lz4"
+
+    def __init__(self) -> None:
+        if lz4_frame is None:
+            raise SerializerException("lz4 is not installed, see the lz4 extra")
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+# listed out, as mypy does not infer a tuple of the classes as concrete
+CODECS: dict[str, type[Codec]] = {
+    PickleCodec.name: PickleCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+COMPRESSORS: dict[str, type[Compressor]] = {
+    ZstdCompressor.name: ZstdCompressor,
+    Lz4Compressor.name: Lz4Compressor,
+}
+
+
+@cache
+def get_codec(key: int | str) -> Codec:
+    for codec in CODECS.values():
+        if key in (codec.id, codec.name):
+            return codec()
+    raise SerializerException(f"Unknown codec: {key}")
+
+
+@cache
+def get_compressor(key: int | str) -> Compressor:
+    for compressor in COMPRESSORS.values():
+        if key in (compressor.id, compressor.name):
+            return compressor()
+    raise SerializerException(f"Unknown compressor: {key}")
+
+
+class Serializer:
+    """Encodes values as a header byte followed by the payload.
+
+    The low nibble of the header is the codec id, the high nibble the
+    compressor id (0 for none), so any value can be decoded regardless of the
+    serializer that is currently configured.
+    """
+
+    def __init__(
+        self, codec: str = "pickle", compression: str = "", threshold: int = 1024
+    ) -> None:
+        self.codec = get_codec(codec)
+        self.compressor = get_compressor(compression) if compression else None
+        self.threshold = threshold
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.codec.encode(value)
+        header = self.codec.id
+        if self.compressor is not None and len(data) >= self.threshold:
+            data = self.compressor.compress(data)
+            header |= self.compressor.id << 4
+        return bytes((header,)) + data
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        header = data[0]
+        if header == PICKLE_PROTO:
+            return pickle.loads(data)  # noqa: S301
+
+        payload = data[1:]
+        if header >> 4:
+            payload = get_compressor(header >> 4).decompress(payload)
+        return get_codec(header & 0x0F).decode(payload)
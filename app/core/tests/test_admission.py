@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi.responses import PlainTextResponse
+from httpx import AsyncClient
+from starlette.types import Receive, Scope, Send
+
+from app.core.admission import AdaptiveLimit, AdmissionMiddleware, AdmissionRule
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_adaptive_limit_queues_and_sheds() -> None:
+    limit = AdaptiveLimit("test", limit=1, queue_size=1, queue_timeout=60)
+
+    assert await limit.acquire()
+    waiting = asyncio.create_task(limit.acquire())
+    await asyncio.sleep(0)
+    # the queue is full
+    assert not await limit.acquire()
+
+    limit.release()
+    assert await waiting
+    assert limit.in_flight == 1
+    limit.release()
+    assert limit.in_flight == 0
+
+
+async def test_adaptive_limit_queue_timeout() -> None:
+    limit = AdaptiveLimit("test", limit=1, queue_size=1, queue_timeout=0.01)
+    await limit.acquire()
+
+    assert not await limit.acquire()
+    assert not limit.waiters
+    limit.release()
+    assert limit.in_flight == 0
+
+
+async def test_adaptive_limit_cancelled_waiter() -> None:
+    limit = AdaptiveLimit("test", limit=1, queue_size=1, queue_timeout=60)
+    await limit.acquire()
+    waiting = asyncio.create_task(limit.acquire())
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert not limit.waiters
+    limit.release()
+    assert limit.in_flight == 0
+
+
+def test_adaptive_limit_follows_latency() -> None:
+    limit = AdaptiveLimit("test", limit=100, min_limit=10, max_limit=200)
+    limit.in_flight = 100
+
+    for _ in range(50):
+        limit._update(0.01)
+    grown = limit.limit
+    assert grown > 100
+
+    for _ in range(50):
+        limit._update(0.1)
+    assert limit.limit < grown / 2
+    assert limit.limit >= 10
+
+
+def test_adaptive_limit_does_not_grow_unused() -> None:
+    limit = AdaptiveLimit("test", limit=100)
+    limit.in_flight = 10
+
+    for _ in range(50):
+        limit._update(0.01)
+    assert limit.limit == 100
+
+
+async def test_admission_middleware() -> None:
+    release = asyncio.Event()
+
+    async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"] == "/slow":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    slow = AdaptiveLimit("slow", limit=1, queue_size=0)
+    app = AdmissionMiddleware(
+        endpoint,
+        [
+            AdmissionRule("/slow", slow),
+            AdmissionRule("/{path:path}", AdaptiveLimit("default")),
+        ],
+    )
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        first = asyncio.create_task(client.get("/slow"))
+        while not slow.in_flight:
+            await asyncio.sleep(0)
+
+        shed = await client.get("/slow")
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "1"
+        assert shed.json()["errorCode"] == "app_overloaded"
+        assert (await client.get("/other")).status_code == 200
+
+        release.set()
+        assert (await first).status_code == 200
+
+    assert slow.in_flight == 0
@@ -0,0 +1,193 @@
+import re
+import shutil
+import subprocess
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import MagicMock, call
+
+import orjson
+import pytest
+from pytest_mock import MockerFixture
+from redis.asyncio.cluster import RedisCluster
+from redis.crc import key_slot
+
+from app.core.backends import (
+    BackendException,
+    MemoryBackend,
+    RedisBackend,
+    RedisClusterBackend,
+    ShardedBackend,
+    hash_tag,
+    pop_members,
+)
+from app.core.cache import Cache, CacheHandler, CacheInvalidator
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis_urls(tmp_path: Path) -> Iterator[list[str]]:
+    server = shutil.which("redis-server") or ""
+    if not server:
+        pytest.skip("redis-server is not installed")
+    version = subprocess.run(  # noqa: S603
+        [server, "--version"], capture_output=True, text=True, check=True
+    ).stdout
+    match = re.search(r"v=(\d+)", version)
+    if match is None or int(match.group(1)) < 7:
+        pytest.skip("Redis 7 is required")
+
+    sockets = [tmp_path / f"redis-{i}.sock" for i in range(3)]
+    processes = [
+        subprocess.Popen(  # noqa: S603
+            [server, "--port", "0", "--unixsocket", str(socket), "--save", ""],
+            stdout=subprocess.DEVNULL,
+        )
+        for socket in sockets
+    ]
+    deadline = time.monotonic() + 5
+    while not all(socket.exists() for socket in sockets):
+        assert time.monotonic() < deadline, "redis-server did not start"
+        time.sleep(0.01)
+
+    yield [f"unix://{socket}" for socket in sockets]
+
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+def sharded_memory() -> ShardedBackend:
+    return ShardedBackend([MemoryBackend() for _ in range(3)])
+
+
+@pytest.fixture
+def cluster(mocker: MockerFixture) -> MagicMock:
+    client = mocker.MagicMock()
+    client.unlink = mocker.AsyncMock()
+    client.execute_command = mocker.AsyncMock()
+    mocker.patch.object(RedisCluster, "from_url", return_value=client)
+    return client
+
+
+def test_hash_tag() -> None:
+    assert hash_tag("{/users}_en_") == "/users"
+    assert hash_tag("tag:{user:1}") == "user:1"
+    assert hash_tag("plain") == "plain"
+    assert hash_tag("empty{}") == "empty{}"
+
+
+def test_hash_ring_is_stable_and_spread() -> None:
+    backend = sharded_memory()
+    keys = [f"key:{i}" for i in range(300)]
+    shards = [backend.ring.get(key) for key in keys]
+
+    assert shards == [sharded_memory().ring.get(key) for key in keys]
+    assert set(shards) == {0, 1, 2}
+    assert backend.ring.get("{/users}_en_") == backend.ring.get("tag:{/users}")
+
+
+async def test_sharded_backend_bulk() -> None:
+    backend = sharded_memory()
+    items = [(f"key:{i}", str(i).encode(), 60) for i in range(30)]
+    await backend.set_many(items)
+
+    rets = await backend.get_many([key for key, _, _ in items], with_ttl=True)
+    assert rets == [(value, 60) for _, value, _ in items]
+    for shard in backend.shards:
+        assert isinstance(shard, MemoryBackend)
+        assert 0 < len(shard._data) < 30
+
+    await backend.delete_many([key for key, _, _ in items])
+    assert await backend.get("key:0") is None
+
+
+async def test_sharded_backend_invalidate_across_shards(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Cache, "backend", sharded_memory())
+    monkeypatch.setattr(Cache, "local", None)
+    handlers = [CacheHandler(f"/route/{i}", tags=["user:1"]) for i in range(10)]
+    for handler in handlers:
+        await handler.set("en_", handler.main_key)
+
+    assert await handlers[0].invalidate() == 1
+    assert await handlers[0].get("en_") is None
+    assert await handlers[1].get("en_") == "/route/1"
+
+    await CacheInvalidator.invalidate("user:1")
+    assert await Cache.get_many([h._cache_key("en_") for h in handlers]) == [None] * 10
+
+
+async def test_sharded_backend_scripts_need_one_shard() -> None:
+    backend = sharded_memory()
+    await backend.add_to_tags(["tag:{a}"], ["{a}_1", "{a}_2"], 60)
+
+    assert sorted(await backend.run_script(pop_members, ["tag:{a}"], [])) == [
+        b"{a}_1",
+        b"{a}_2",
+    ]
+    keys = [f"key:{i}" for i in range(10)]
+    with pytest.raises(BackendException):
+        await backend.run_script(pop_members, keys, [])
+
+
+async def test_sharded_redis(redis_urls: list[str]) -> None:
+    backend = ShardedBackend([RedisBackend(url) for url in redis_urls])
+    items = [(f"{{/users}}_{i}", str(i).encode(), 60) for i in range(5)]
+    items += [(f"{{/posts}}_{i}", str(i).encode(), 60) for i in range(5)]
+    await backend.set_many(items[:5], ["tag:{/users}", "tag:{user:1}"])
+    await backend.set_many(items[5:], ["tag:{/posts}", "tag:{user:1}"])
+
+    rets = await backend.get_many([key for key, _, _ in items], with_ttl=True)
+    assert rets == [(value, 60) for _, value, _ in items]
+
+    removed = await backend.invalidate(["tag:{user:1}"])
+
+    assert sorted(removed) == sorted(key for key, _, _ in items)
+    assert await backend.get_many([key for key, _, _ in items]) == [(None, -2)] * 10
+    await backend.close()
+
+
+async def test_redis_cluster_bulk(cluster: MagicMock, mocker: MockerFixture) -> None:
+    backend = RedisClusterBackend("redis://localhost:7000")
+    pipe = mocker.MagicMock()
+    pipe.execute = mocker.AsyncMock(side_effect=[[b"1", 60, None, -2], []])
+    cluster.pipeline.return_value.__aenter__.return_value = pipe
+
+    rets = await backend.get_many(["{/a}_en_", "{/b}_en_"], with_ttl=True)
+    assert rets == [(b"1", 60), (None, -2)]
+    pipe.get.assert_has_calls([call("{/a}_en_"), call("{/b}_en_")])
+
+    await backend.set_many([("{/a}_en_", b"1", 60)], ["tag:{/a}"], channel="keys")
+    pipe.set.assert_called_once_with("{/a}_en_", b"1", ex=60)
+    pipe.sadd.assert_called_once_with("tag:{/a}", "{/a}_en_")
+    # a route's entries and its tag set share a hash slot
+    assert key_slot(b"tag:{/a}") == key_slot(b"{/a}_en_")
+    # cluster pipelines cannot publish, so it goes to a random node instead
+    pipe.publish.assert_not_called()
+    cluster.execute_command.assert_awaited_once_with(
+        "PUBLISH", "keys", orjson.dumps(["{/a}_en_"]), target_nodes=RedisCluster.RANDOM
+    )
+
+
+async def test_redis_cluster_invalidate_per_tag(
+    cluster: MagicMock, mocker: MockerFixture
+) -> None:
+    members = {"tag:{/a}": [b"{/a}_en_", b"{/a}_tr_"], "tag:{user:1}": [b"{/b}_en_"]}
+    script = mocker.AsyncMock(side_effect=lambda keys, args: members[keys[0]])
+    cluster.register_script.return_value = script
+    backend = RedisClusterBackend("redis://localhost:7000")
+
+    removed = await backend.invalidate(["tag:{/a}", "tag:{user:1}"], channel="keys")
+
+    assert removed == ["{/a}_en_", "{/a}_tr_", "{/b}_en_"]
+    # one script per tag set, as the sets live in different slots
+    cluster.register_script.assert_called_once_with(pop_members.source)
+    script.assert_has_awaits([call(["tag:{/a}"], []), call(["tag:{user:1}"], [])])
+    assert key_slot(b"tag:{/a}") != key_slot(b"tag:{user:1}")
+    cluster.unlink.assert_awaited_once_with(*removed)
+    cluster.execute_command.assert_awaited_once_with(
+        "PUBLISH", "keys", orjson.dumps(removed), target_nodes=RedisCluster.RANDOM
+    )
@@ -0,0 +1,106 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.core.backends import MemoryBackend
+from app.core.breaker import CircuitBreaker
+from app.core.cache import Cache, CacheHandler
+from app.core.limiter import RateLimiter
+from app.core.metrics import Metrics
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def pending(monkeypatch: pytest.MonkeyPatch) -> defaultdict[str, float]:
+    counter: defaultdict[str, float] = defaultdict(float)
+    monkeypatch.setattr(Metrics, "_pending", counter)
+    return counter
+
+
+async def fail() -> int:
+    raise ConnectionError
+
+
+async def succeed() -> int:
+    return 1
+
+
+async def test_circuit_breaker_opens_and_recovers(
+    pending: defaultdict[str, float]
+) -> None:
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, recovery_time=60)
+
+    assert await breaker.call(fail, 0) == 0
+    assert breaker.state == "closed"
+    assert await breaker.call(fail, 0) == 0
+    assert breaker.state == "open"
+    # open: the call is not even made
+    assert await breaker.call(succeed, 0) == 0
+
+    breaker.opened_at -= 60
+    assert await breaker.call(fail, 0) == 0
+    assert breaker.state == "open"
+
+    breaker.opened_at -= 60
+    assert await breaker.call(succeed, 0) == 1
+    assert breaker.state == "closed"
+
+    transitions = 'circuit_breaker_transitions_total{breaker="test",state="%s"}'
+    assert pending[transitions % "open"] == 2
+    assert pending[transitions % "half_open"] == 2
+    assert pending[transitions % "closed"] == 1
+    fallbacks = 'circuit_breaker_fallbacks_total{breaker="test",reason="%s"}'
+    assert pending[fallbacks % "error"] == 3
+    assert pending[fallbacks % "open"] == 1
+
+
+async def test_circuit_breaker_latency_budget() -> None:
+    breaker = CircuitBreaker("test", timeout=0.01, failure_threshold=1)
+
+    async def slow() -> int:
+        await asyncio.sleep(1)
+        return 1
+
+    assert await breaker.call(slow, 0) == 0
+    assert breaker.state == "open"
+
+
+async def test_circuit_breaker_probes_once() -> None:
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=1)
+    await breaker.call(fail, 0)
+    breaker.opened_at -= breaker.recovery_time
+    probe = asyncio.Event()
+
+    async def wait() -> int:
+        await probe.wait()
+        return 1
+
+    task = asyncio.create_task(breaker.call(wait, 0))
+    await asyncio.sleep(0)
+    assert breaker.state == "half_open"
+    assert await breaker.call(succeed, 0) == 0
+    probe.set()
+    assert await task == 1
+    assert await breaker.call(succeed, 0) == 1
+
+
+async def test_cache_and_limiter_fall_back(
+    memory_backend: MemoryBackend,
+    monkeypatch: pytest.MonkeyPatch,
+    mocker: MockerFixture,
+) -> None:
+    monkeypatch.setattr(Cache, "breaker", CircuitBreaker("cache", 1))
+    monkeypatch.setattr(RateLimiter, "breaker", CircuitBreaker("limiter", 1))
+    users = CacheHandler("/users")
+    await users.set("en_", {"id": 1})
+    for method in ("get", "get_with_ttl", "set", "set_many", "run_script"):
+        mocker.patch.object(memory_backend, method, side_effect=ConnectionError)
+
+    assert await users.get("en_") is None
+    await users.set("en_", {"id": 2})
+    limiter = RateLimiter(times=1, minutes=1)
+    assert (await limiter.hit("key")).retry_after == 0
+    assert (await limiter.hit("key")).retry_after == 0
@@ -0,0 +1,339 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import pytest
+from fastapi import Depends, FastAPI, Header, Request, Response
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app.core.backends import MemoryBackend
+from app.core.cache import (
+    Cache,
+    CacheHandler,
+    CacheInvalidator,
+    LocalCache,
+    SingleFlight,
+    Vary,
+    cache_route,
+    etag_matches,
+    make_etag,
+)
+from app.core.metrics import Metrics
+
+pytestmark = pytest.mark.anyio
+
+
+def test_local_cache_lru_eviction() -> None:
+    cache = LocalCache(maxsize=2, ttl=60)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == (1, 60)
+
+    cache.set("c", 3, 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert len(cache) == 2
+
+
+def test_local_cache_expiry(mocker: MockerFixture) -> None:
+    now = time.monotonic()
+    monotonic = mocker.patch("app.core.cache.time.monotonic", return_value=now)
+    cache = LocalCache(maxsize=10, ttl=5)
+    cache.set("short", "value", 2)
+    cache.set("long", "value", 60)
+
+    monotonic.return_value = now + 3
+    assert cache.get("short") is None
+    assert cache.get("long") == ("value", 57)
+
+    monotonic.return_value = now + 6
+    assert cache.get("long") is None
+
+
+def test_local_cache_delete() -> None:
+    cache = LocalCache(maxsize=10, ttl=5)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, -1)
+    assert cache.get("b") == (2, -1)
+
+    cache.delete("a", "b", "missing")
+
+    assert len(cache) == 0
+
+
+def test_make_etag_is_stable() -> None:
+    assert make_etag(b"body") == make_etag(b"body")
+    assert make_etag(b"body") != make_etag(b"other")
+    assert make_etag(b"body", weak=True) == f"W/{make_etag(b'body')}"
+
+
+def test_etag_matches() -> None:
+    etag = make_etag(b"body")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+async def test_single_flight_coalesces_calls() -> None:
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*[flight.do("key", compute) for _ in range(10)])
+
+    assert results == [1] * 10
+    assert await flight.do("key", compute) == 2
+
+
+async def test_single_flight_propagates_errors() -> None:
+    flight = SingleFlight()
+
+    async def fail() -> None:
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        await flight.do("key", fail)
+
+
+def test_cache_route_cache_control() -> None:
+    assert cache_route(expire=60).cache_control(42) == "max-age=42"
+
+    swr = cache_route(expire=60, stale=30)
+    assert swr.cache_control(90) == "max-age=60, stale-while-revalidate=30"
+    assert swr.cache_control(10) == "max-age=0, stale-while-revalidate=10"
+
+    per_user = cache_route(expire=60, vary=[Vary("user", str, private=True)])
+    assert per_user.cache_control(42) == "private, max-age=42"
+    assert cache_route(vary=["Authorization"]).cache_control(42).startswith("private")
+    assert cache_route(vary=["Accept"]).cache_control(42) == "max-age=42"
+
+
+def test_cache_route_should_refresh(mocker: MockerFixture) -> None:
+    route = cache_route(expire=60, stale=30)
+    assert not route.should_refresh(31)
+    assert route.should_refresh(30)
+
+    # redis rounds the last half second down to 0, which is not stale without stale=
+    stale_hits = Cache.stats["stale_hits"]
+    assert not cache_route(expire=60).should_refresh(0)
+    assert Cache.stats["stale_hits"] == stale_hits
+
+    xfetch = cache_route(expire=60, stale=30, beta=1.0)
+    xfetch.delta = 1.0
+    mocker.patch("app.core.cache.random.random", return_value=0.5)
+    assert not xfetch.should_refresh(40)
+    mocker.patch("app.core.cache.random.random", return_value=1 - 1e-9)
+    assert xfetch.should_refresh(40)
+
+
+async def test_cache_route(memory_backend: MemoryBackend) -> None:
+    app = FastAPI()
+    calls = []
+
+    @app.get("/items/{item_id}")
+    @cache_route(expire=60)
+    async def item(item_id: int) -> dict[str, int]:
+        calls.append(item_id)
+        return {"id": item_id}
+
+    @app.get("/rendered/{item_id}")
+    @cache_route(expire=60, render=True)
+    async def rendered(item_id: int) -> dict[str, int]:
+        calls.append(item_id)
+        return {"id": item_id}
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        for url in ("/items/1", "/rendered/2"):
+            miss = await client.get(url)
+            hit = await client.get(url)
+            etag = {"If-None-Match": hit.headers["ETag"]}
+            not_modified = await client.get(url, headers=etag)
+            bypass = await client.get(url, headers={"Cache-Control": "no-cache"})
+
+            assert miss.json() == hit.json() == bypass.json()
+            assert hit.headers["ETag"] == miss.headers["ETag"]
+            assert hit.headers["Cache-Control"] == "max-age=60"
+            assert not_modified.status_code == 304
+            assert not_modified.content == b""
+
+    # computed on the miss and the bypass only
+    assert calls == [1, 1, 2, 2]
+    assert hit.headers["ETag"].startswith('"')
+    assert hit.headers["Content-Type"] == "application/json"
+
+
+async def test_cache_route_keeps_per_request_headers(
+    memory_backend: MemoryBackend,
+) -> None:
+    app = FastAPI()
+    calls = []
+
+    @app.get("/session")
+    @cache_route(expire=60, render=True)
+    async def session(response: Response, x_user: str = Header()) -> dict[str, bool]:
+        calls.append("session")
+        await asyncio.sleep(0.01)
+        response.set_cookie("session", x_user)
+        return {"ok": True}
+
+    @app.get("/traced")
+    @cache_route(expire=60, render=True)
+    async def traced(response: Response) -> dict[str, bool]:
+        calls.append("traced")
+        response.headers["X-Request-ID"] = "first"
+        response.headers["X-Version"] = "1"
+        return {"ok": True}
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        # concurrent misses are coalesced, but each gets its own cookie
+        sessions = await asyncio.gather(
+            *[client.get("/session", headers={"X-User": user}) for user in "ab"]
+        )
+        assert [res.cookies["session"] for res in sessions] == ["a", "b"]
+        miss = await client.get("/traced")
+        hit = await client.get("/traced")
+
+    # responses that set cookies are not cached
+    assert calls == ["session", "session", "traced"]
+    # the miss is answered from the entry too, so both match
+    for res in (miss, hit):
+        assert "X-Request-ID" not in res.headers
+        assert res.headers["X-Version"] == "1"
+
+
+async def test_cache_route_lock(memory_backend: MemoryBackend) -> None:
+    calls = []
+
+    def make_worker() -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/slow")
+        @cache_route(lock=True)
+        async def slow() -> int:
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return len(calls)
+
+        return app
+
+    async def get(app: FastAPI) -> int:
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            return (await client.get("/slow")).json()
+
+    # two workers missing at once, each with its own single flight
+    assert await asyncio.gather(get(make_worker()), get(make_worker())) == [1, 1]
+    assert calls == [1]
+
+    pending = Metrics._pending
+    for outcome in ("acquired", "served"):
+        labels = f'{{route="/slow",outcome="{outcome}"}}'
+        assert pending[f"cache_route_locks_total{labels}"] >= 1
+        assert pending[f"cache_route_lock_wait_seconds_count{labels}"] >= 1
+    served = 'cache_route_lock_wait_seconds_sum{route="/slow",outcome="served"}'
+    assert pending[served] >= 0.1
+
+
+@pytest.mark.parametrize("render", [False, True])
+async def test_cache_route_stale(memory_backend: MemoryBackend, render: bool) -> None:
+    app = FastAPI()
+    calls = []
+
+    @app.get("/stale", status_code=201)
+    @cache_route(expire=60, stale=30, render=render)
+    async def stale() -> int:
+        calls.append(1)
+        return len(calls)
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        assert (await client.get("/stale")).json() == 1
+        # expired, but still within the stale window
+        memory_backend.expire("{/stale}_en_", 10)
+
+        served = await client.get("/stale")
+        await asyncio.gather(*stale.cache_route._refreshes)  # type: ignore[attr-defined]
+        refreshed = await client.get("/stale")
+
+    assert served.json() == 1
+    assert served.headers["Cache-Control"] == "max-age=0, stale-while-revalidate=10"
+    assert refreshed.json() == 2
+    assert refreshed.status_code == 201
+    assert refreshed.headers["Cache-Control"] == "max-age=60, stale-while-revalidate=30"
+    assert calls == [1, 1]
+
+
+def test_cache_route_stale_requires_plain_parameters() -> None:
+    async def with_dependency(user: str = Depends(lambda: "user")) -> str:
+        return user
+
+    async def with_request(request: Request) -> str:
+        return request.url.path
+
+    async def with_query(q: str = "") -> str:
+        return q
+
+    funcs: list[Callable[..., Awaitable[str]]] = [with_dependency, with_request]
+    for func in funcs:
+        with pytest.raises(ValueError):
+            cache_route(stale=30)(func)
+        with pytest.raises(ValueError):
+            cache_route(beta=1.0)(func)
+    cache_route()(with_dependency)
+    cache_route(stale=30)(with_query)
+
+
+async def test_cache_set_get(memory_backend: MemoryBackend) -> None:
+    await Cache.set("key", {"value": 1}, timeout=60)
+
+    assert await Cache.get("key") == {"value": 1}
+    assert await Cache.get_with_ttl("key") == ({"value": 1}, 60)
+    assert await Cache.get("missing", "default") == "default"
+
+
+async def test_cache_bulk(memory_backend: MemoryBackend) -> None:
+    await Cache.set_many({"a": 1, "b": 2}, timeout={"a": 10, "b": 20})
+
+    assert await Cache.get_many(["a", "b", "c"]) == [1, 2, None]
+    assert memory_backend.ttl("b") == 20
+
+    await Cache.delete_many(["a", "b"])
+
+    assert await Cache.get_many(["a", "b"]) == [None, None]
+
+
+async def test_cache_invalidator(memory_backend: MemoryBackend) -> None:
+    users = CacheHandler("/users", tags=["user:1"])
+    posts = CacheHandler("/posts")
+    await users.set("en_", [1])
+    await posts.set("en_", [2])
+
+    assert await CacheInvalidator.invalidate("user:1") == 1
+
+    assert await users.get("en_") is None
+    assert await posts.get("en_") == [2]
+
+
+async def test_cache_local_invalidation(memory_backend: MemoryBackend) -> None:
+    Cache.local = LocalCache(maxsize=10, ttl=60)
+    await Cache.startup()
+    await asyncio.sleep(0)
+    await Cache.set("key", "value")
+    assert await Cache.get("key") == "value"
+
+    # another worker deleting the key
+    await memory_backend.delete_many(["key"], Cache.invalidation_channel)
+    await asyncio.sleep(0)
+
+    assert Cache.local.get("key") is None
+    await Cache.shutdown()
@@ -0,0 +1,197 @@
+import gzip
+
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app.core import compression
+from app.core.backends import MemoryBackend
+from app.core.cache import CachedResponse, cache_route
+from app.core.compression import (
+    ENCODINGS,
+    CompressionMiddleware,
+    compressible,
+    negotiate,
+)
+
+pytestmark = pytest.mark.anyio
+
+TEXT = "lorem ipsum dolor sit amet " * 100
+
+
+def decompress(encoding: str, data: bytes) -> str:
+    if encoding == "br":
+        data = compression.brotli.decompress(data)
+    elif encoding == "zstd":
+        data = compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    else:
+        data = gzip.decompress(data)
+    return data.decode()
+
+
+async def get_raw(
+    client: AsyncClient, url: str, encoding: str
+) -> tuple[httpx.Response, str]:
+    headers = {"Accept-Encoding": encoding}
+    async with client.stream("GET", url, headers=headers) as r:
+        raw = b"".join([chunk async for chunk in r.aiter_raw()])
+    return r, decompress(encoding, raw)
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/text")
+    async def text() -> PlainTextResponse:
+        return PlainTextResponse(TEXT, headers={"ETag": '"abc"', "Vary": "Cookie"})
+
+    @app.get("/small")
+    async def small() -> PlainTextResponse:
+        return PlainTextResponse("small")
+
+    @app.get("/image")
+    async def image() -> Response:
+        return Response(TEXT, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        return StreamingResponse(iter([TEXT, TEXT]), media_type="text/plain")
+
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "encoding"),
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=1.0, zstd;q=0.5", "gzip"),
+        ("gzip, zstd", "zstd" if "zstd" in ENCODINGS else "gzip"),
+        ("br;q=0.9, gzip;q=0.8", "br"),
+        # the most preferred of the encodings installed
+        ("*", next(iter(ENCODINGS))),
+        ("*, zstd;q=0", "br"),
+        ("gzip;q=0", None),
+        ("gzip;q=x, br", "br"),
+    ],
+)
+def test_negotiate(accept_encoding: str, encoding: str | None) -> None:
+    assert negotiate(accept_encoding) == encoding
+
+
+def test_compressible() -> None:
+    assert compressible([(b"content-type", b"text/html; charset=utf-8")])
+    assert compressible([(b"content-type", b"application/problem+json")])
+    assert not compressible([(b"content-type", b"image/png")])
+    assert not compressible([(b"content-type", b"text/event-stream")])
+    assert not compressible(
+        [(b"content-type", b"text/html"), (b"content-encoding", b"br")]
+    )
+    assert not compressible(
+        [(b"content-type", b"text/html"), (b"cache-control", b"no-transform")]
+    )
+
+
+@pytest.mark.parametrize("encoding", list(ENCODINGS))
+async def test_compression_middleware(app: FastAPI, encoding: str) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r, text = await get_raw(client, "/text", encoding)
+
+    assert r.headers["Content-Encoding"] == encoding
+    assert int(r.headers["Content-Length"]) < len(TEXT)
+    assert text == TEXT
+    assert r.headers["ETag"] == 'W/"abc"'
+    assert r.headers["Vary"] == "Cookie, Accept-Encoding"
+
+
+async def test_compression_middleware_skips(app: FastAPI) -> None:
+    headers = {"Accept-Encoding": "gzip"}
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        small = await client.get("/small", headers=headers)
+        image = await client.get("/image", headers=headers)
+        identity = await client.get("/text", headers={"Accept-Encoding": "identity"})
+
+    for r in (small, image, identity):
+        assert "Content-Encoding" not in r.headers
+    assert identity.headers["ETag"] == '"abc"'
+
+
+@pytest.mark.parametrize("encoding", list(ENCODINGS))
+async def test_compression_middleware_streams(app: FastAPI, encoding: str) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r, text = await get_raw(client, "/stream", encoding)
+
+    assert r.headers["Content-Encoding"] == encoding
+    assert "Content-Length" not in r.headers
+    assert text == TEXT * 2
+
+
+async def test_compression_middleware_offloads_large_bodies(
+    mocker: MockerFixture,
+) -> None:
+    run_in_threadpool = mocker.spy(compression, "run_in_threadpool")
+    app = CompressionMiddleware(PlainTextResponse(TEXT), thread_threshold=len(TEXT))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r, text = await get_raw(client, "/", "gzip")
+
+    assert text == TEXT
+    run_in_threadpool.assert_called_once()
+
+
+async def test_compression_middleware_offloads_large_chunks(
+    mocker: MockerFixture,
+) -> None:
+    run_in_threadpool = mocker.spy(compression, "run_in_threadpool")
+    response = StreamingResponse(iter([TEXT, TEXT]), media_type="text/plain")
+    app = CompressionMiddleware(response, thread_threshold=len(TEXT))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r, text = await get_raw(client, "/stream", "gzip")
+
+    assert text == TEXT * 2
+    # both chunks, the last one flushed with it
+    assert run_in_threadpool.call_count == 2
+
+
+async def test_precompressed_cache_route(
+    memory_backend: MemoryBackend, app: FastAPI
+) -> None:
+    @app.get("/cached")
+    @cache_route(render=True, precompress=True)
+    async def cached() -> PlainTextResponse:
+        return PlainTextResponse(TEXT)
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        miss, miss_text = await get_raw(client, "/cached", "gzip")
+        hit, hit_text = await get_raw(client, "/cached", "gzip")
+        identity = await client.get("/cached", headers={"Accept-Encoding": ""})
+        not_modified = await client.get(
+            "/cached",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": hit.headers["ETag"]},
+        )
+
+    # decoding once gives the body, so it was not compressed twice
+    assert miss.headers["Content-Encoding"] == hit.headers["Content-Encoding"] == "gzip"
+    assert miss_text == hit_text == TEXT
+    assert hit.headers["ETag"].startswith('W/"')
+    assert "Content-Encoding" not in identity.headers
+    assert identity.text == TEXT
+    assert identity.headers["Vary"] == "Accept-Encoding"
+    assert not_modified.status_code == 304
+
+
+async def test_cached_response_precompress() -> None:
+    headers = [(b"content-type", b"text/plain; charset=utf-8")]
+    entry = CachedResponse(TEXT.encode(), 200, headers, '"abc"')
+
+    precompressed = await entry.precompress()
+    assert set(precompressed.encoded) == set(ENCODINGS)
+    assert gzip.decompress(precompressed.encoded["gzip"]) == TEXT.encode()
+
+    small = CachedResponse(b"small", 200, headers, '"abc"')
+    assert (await small.precompress()).encoded == {}
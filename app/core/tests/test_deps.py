@@ -0,0 +1,33 @@
+from ipaddress import ip_network
+
+import pytest
+from fastapi import Request
+
+from app.core.config import settings
+from app.core.deps import get_ip_string
+
+
+def make_request(client: str, x_forwarded_for: str | None = None) -> Request:
+    headers = []
+    if x_forwarded_for is not None:
+        headers.append((b"x-forwarded-for", x_forwarded_for.encode()))
+    return Request({"type": "http", "headers": headers, "client": (client, 1234)})
+
+
+def test_get_ip_string_without_proxies() -> None:
+    assert get_ip_string(make_request("1.2.3.4")) == "1.2.3.4"
+    # not from a trusted proxy, so the header is ignored
+    assert get_ip_string(make_request("1.2.3.4", "5.6.7.8")) == "1.2.3.4"
+
+
+def test_get_ip_string_behind_trusted_proxies(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        settings, "TRUSTED_PROXIES", [ip_network("10.0.0.0/8"), ip_network("::1")]
+    )
+
+    assert get_ip_string(make_request("10.0.0.1", "5.6.7.8")) == "5.6.7.8"
+    assert get_ip_string(make_request("::1", "6.6.6.6, 5.6.7.8, 10.0.0.2")) == (
+        "5.6.7.8"
+    )
+    assert get_ip_string(make_request("10.0.0.1", "10.0.0.3, 10.0.0.2")) == ("10.0.0.3")
+    assert get_ip_string(make_request("10.0.0.1")) == "10.0.0.1"
@@ -0,0 +1,203 @@
+import time
+
+import pytest
+from fastapi import Request, Response
+from fastapi.responses import PlainTextResponse
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from starlette.types import Receive, Scope, Send
+
+from app.core import limiter as limiter_module
+from app.core.backends import MemoryBackend, hash_tag
+from app.core.exceptions import ApiException
+from app.core.limiter import RateLimiter, RateLimitMiddleware, RateLimitRule
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def now(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    clock = [1_000_000_000]
+    monkeypatch.setattr(limiter_module, "_now", lambda: clock[0])
+    return clock
+
+
+async def test_rate_limiter_check(memory_backend: MemoryBackend) -> None:
+    limiter = RateLimiter(times=2, seconds=10)
+
+    assert await limiter._check("key") == 0
+    assert await limiter._check("key") == 0
+    assert 9000 < await limiter._check("key") <= 10000
+    assert await limiter._check("other") == 0
+
+
+@pytest.mark.parametrize("algorithm", list(RateLimiter.scripts))
+async def test_rate_limiter_algorithms(
+    memory_backend: MemoryBackend, now: list[int], algorithm: str
+) -> None:
+    limiter = RateLimiter(times=3, seconds=10, algorithm=algorithm)
+
+    assert [(await limiter.hit("key")).remaining for _ in range(3)] == [2, 1, 0]
+    rate_limit = await limiter.hit("key")
+    assert rate_limit.remaining == 0
+    assert 0 < rate_limit.retry_after <= 10000
+    assert 0 < rate_limit.reset <= 20000
+    assert (await limiter.hit("other")).remaining == 2
+
+
+@pytest.mark.parametrize("algorithm", list(RateLimiter.scripts))
+async def test_rate_limiter_grants_what_fits(
+    memory_backend: MemoryBackend, now: list[int], algorithm: str
+) -> None:
+    limiter = RateLimiter(times=5, seconds=10, algorithm=algorithm)
+
+    granted, rate_limit = await limiter._reserve("key", 3)
+    assert (granted, rate_limit.remaining) == (3, 2)
+    granted, rate_limit = await limiter._reserve("key", 3)
+    assert (granted, rate_limit.remaining) == (2, 0)
+    granted, rate_limit = await limiter._reserve("key", 3)
+    assert granted == 0
+    assert rate_limit.retry_after > 0
+
+
+async def test_sliding_window_weights_previous_period(
+    memory_backend: MemoryBackend, now: list[int]
+) -> None:
+    limiter = RateLimiter(times=10, seconds=1, algorithm="sliding_window")
+    for _ in range(10):
+        await limiter.hit("key")
+
+    # half of the previous period still counts
+    now[0] += 1500
+    assert [(await limiter.hit("key")).retry_after for _ in range(6)] == [0] * 5 + [100]
+
+
+async def test_gcra_spreads_requests(
+    memory_backend: MemoryBackend, now: list[int]
+) -> None:
+    limiter = RateLimiter(times=2, seconds=1, algorithm="gcra")
+
+    assert (await limiter.hit("key")).retry_after == 0
+    assert (await limiter.hit("key")).retry_after == 0
+    assert (await limiter.hit("key")).retry_after == 500
+    now[0] += 500
+    assert (await limiter.hit("key")).retry_after == 0
+    assert (await limiter.hit("key")).retry_after == 500
+
+
+async def test_local_rate_limiter_reserves_batches(
+    memory_backend: MemoryBackend, mocker: MockerFixture
+) -> None:
+    limiter = RateLimiter(times=100, minutes=1, local_error=0.1, sync_interval=60)
+    run_script = mocker.spy(memory_backend, "run_script")
+
+    remaining = [(await limiter.hit("key")).remaining for _ in range(100)]
+    assert remaining == list(range(99, -1, -1))
+    assert run_script.call_count == 10
+
+    assert (await limiter.hit("key")).retry_after > 0
+    assert (await limiter.hit("key")).retry_after > 0
+    assert run_script.call_count == 11
+
+
+async def test_local_rate_limiter_drops_unspent_units(
+    memory_backend: MemoryBackend, mocker: MockerFixture
+) -> None:
+    limiter = RateLimiter(times=100, minutes=1, local_error=0.1, sync_interval=1)
+    run_script = mocker.spy(memory_backend, "run_script")
+    await limiter.hit("key")
+
+    mocker.patch("time.monotonic", return_value=time.monotonic() + 2)
+    assert (await limiter.hit("key")).remaining == 89
+    assert run_script.call_count == 2
+
+
+async def test_rate_limiter_headers(memory_backend: MemoryBackend) -> None:
+    limiter = RateLimiter(times=1, minutes=1, algorithm="gcra")
+    request = Request(
+        {"type": "http", "method": "GET", "path": "/users", "headers": []}
+    )
+    response = Response()
+
+    await limiter(request, response, "1.2.3.4")
+    assert response.headers["RateLimit-Limit"] == "1"
+    assert response.headers["RateLimit-Remaining"] == "0"
+    assert response.headers["RateLimit-Reset"] == "60"
+
+    with pytest.raises(ApiException) as exc_info:
+        await limiter(request, response, "1.2.3.4")
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers is not None
+    assert exc_info.value.headers["Retry-After"] == "60"
+
+
+def test_rate_limiter_key_for() -> None:
+    route = type("Route", (), {"path": "/users/{id}"})()
+    scope = {"type": "http", "method": "GET", "path": "/users/1", "headers": []}
+    request = Request({**scope, "route": route})
+    limiter = RateLimiter(algorithm="gcra")
+
+    assert limiter.key_for(request, "1.2.3.4") == (
+        "limiter:{ip:1.2.3.4}:gcra:GET:/users/(id)"
+    )
+    assert (
+        limiter.key_for(Request(scope), None) == "limiter:{ip:None}:gcra:GET:/users/1"
+    )
+
+    limiter = RateLimiter(by_user=lambda request: "7")
+    assert limiter.key_for(request, "1.2.3.4") == (
+        "limiter:{user:7}:fixed_window:GET:/users/(id)"
+    )
+
+
+def test_rate_limiter_key_is_tagged_by_client() -> None:
+    scope = {"type": "http", "method": "GET", "path": "/users/1", "headers": []}
+    request = Request(scope)
+    limiter = RateLimiter()
+
+    # not `path:path` for every client of the catch-all rule
+    assert hash_tag(limiter.key_for(request, "1.2.3.4", "/{path:path}")) == (
+        "ip:1.2.3.4"
+    )
+    assert hash_tag(limiter.key_for(request, "5.6.7.8", "/{path:path}")) == (
+        "ip:5.6.7.8"
+    )
+    assert hash_tag(limiter.key_for(request, "{x}", "/users/{id}")) == "ip:(x)"
+
+
+async def test_rate_limit_middleware(memory_backend: MemoryBackend) -> None:
+    calls = []
+
+    async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+        calls.append(scope["path"])
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    app = RateLimitMiddleware(
+        endpoint,
+        [
+            RateLimitRule("/login", RateLimiter(times=1, minutes=1), methods=["POST"]),
+            RateLimitRule("/users/{id}", RateLimiter(times=2, minutes=1)),
+        ],
+    )
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r = await client.get("/users/1")
+        assert r.status_code == 200
+        assert r.headers["RateLimit-Remaining"] == "1"
+        # keyed by the template, not the path
+        assert (await client.get("/users/2")).status_code == 200
+        r = await client.get("/users/3")
+        assert r.status_code == 429
+        assert r.json()["errorCode"] == "app_too_many_requests"
+        assert r.headers["Retry-After"] == "60"
+
+        assert (await client.post("/login")).status_code == 200
+        assert (await client.post("/login")).status_code == 429
+        assert (await client.get("/login")).status_code == 200
+        assert (await client.get("/other")).headers.get("RateLimit-Limit") is None
+
+    assert calls == ["/users/1", "/users/2", "/login", "/login", "/other"]
+
+
+def test_rate_limiter_unknown_algorithm() -> None:
+    with pytest.raises(ValueError):
+        RateLimiter(algorithm="leaky")
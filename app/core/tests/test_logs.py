@@ -0,0 +1,74 @@
+import json
+import logging
+import queue
+import sys
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict
+
+from app.core import logs
+from app.core.logs import JsonFormatter, NonBlockingQueueHandler
+
+pytestmark = pytest.mark.anyio
+
+
+def test_json_formatter() -> None:
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("app.test.json")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logger.makeRecord(
+            logger.name,
+            logging.ERROR,
+            __file__,
+            1,
+            "failed %s",
+            ("task",),
+            sys.exc_info(),
+            extra={"timing": {"db_ms": 1.5}},
+        )
+
+    line = JsonFormatter().format(handler.prepare(record))
+    data = json.loads(line)
+    assert data["level"] == "ERROR"
+    assert data["message"] == "failed task"
+    assert data["timing"] == {"db_ms": 1.5}
+    assert "ValueError: boom" in data["exc_info"]
+
+
+def test_queue_handler_drops_when_full() -> None:
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("app.test.queue")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("first")
+        logger.warning("second")
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+    assert handler.queue.qsize() == 1
+
+
+async def test_client_session_forwards_request_id() -> None:
+    headers: CIMultiDict[str] = CIMultiDict()
+    params = aiohttp.TraceRequestStartParams("GET", None, headers)  # type: ignore
+    token = logs.request_id.set("abc")
+    try:
+        await logs._on_request_start(None, None, params)  # type: ignore[arg-type]
+    finally:
+        logs.request_id.reset(token)
+
+    assert headers["X-Request-ID"] == "abc"
+
+
+def test_sentry_before_send() -> None:
+    token = logs.request_id.set("abc")
+    try:
+        assert logs.sentry_before_send({}, {}) == {"tags": {"request_id": "abc"}}
+    finally:
+        logs.request_id.reset(token)
+    assert logs.sentry_before_send({}, {}) == {}
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app.core.backends import MemoryBackend
+from app.core.cache import CacheHandler
+from app.core.config import settings
+from app.core.metrics import Metrics
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def pending(monkeypatch: pytest.MonkeyPatch) -> defaultdict[str, float]:
+    counter: defaultdict[str, float] = defaultdict(float)
+    monkeypatch.setattr(Metrics, "_pending", counter)
+    return counter
+
+
+async def test_metrics_render(memory_backend: MemoryBackend) -> None:
+    Metrics.inc("cache_route_requests_total", route="/users", result="hit")
+    Metrics.inc("cache_route_requests_total", route="/users", result="hit")
+    Metrics.observe("cache_route_fill_seconds", 0.003, route="/users")
+    Metrics.observe("cache_route_fill_seconds", 0.2, route="/users")
+    Metrics.observe("cache_route_fill_seconds", 60, route="/users")
+
+    lines = (await Metrics.render(memory_backend)).splitlines()
+
+    assert "# TYPE cache_route_requests_total counter" in lines
+    assert 'cache_route_requests_total{route="/users",result="hit"} 2' in lines
+    assert "# TYPE cache_route_fill_seconds histogram" in lines
+    assert 'cache_route_fill_seconds_bucket{route="/users",le="0.005"} 1' in lines
+    assert 'cache_route_fill_seconds_bucket{route="/users",le="0.25"} 2' in lines
+    assert 'cache_route_fill_seconds_bucket{route="/users",le="+Inf"} 3' in lines
+    assert 'cache_route_fill_seconds_count{route="/users"} 3' in lines
+    assert 'cache_route_fill_seconds_sum{route="/users"} 60.203' in lines
+
+
+async def test_metrics_are_added_up_across_flushes(
+    memory_backend: MemoryBackend,
+) -> None:
+    Metrics.inc("cache_lookups_total", 2, route="a")
+    await Metrics.flush(memory_backend)
+    # another worker flushing to the same backend
+    Metrics.inc("cache_lookups_total", 3, route="a")
+
+    assert await Metrics.collect(memory_backend) == {
+        'cache_lookups_total{route="a"}': 5
+    }
+
+
+async def test_metrics_flush_keeps_pending_on_error(
+    memory_backend: MemoryBackend, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(memory_backend, "run_script", side_effect=ConnectionError)
+    Metrics.inc("cache_lookups_total", route="a")
+
+    with pytest.raises(ConnectionError):
+        await Metrics.flush(memory_backend)
+
+    assert Metrics._pending['cache_lookups_total{route="a"}'] == 1
+
+
+async def test_cache_handler_metrics(
+    memory_backend: MemoryBackend, pending: defaultdict[str, float]
+) -> None:
+    users = CacheHandler("/users/1", name="/users/{id}")
+    await users.set("en_", {"id": 1})
+    await users.get("en_")
+    await users.get("tr_")
+
+    lookups = 'cache_lookups_total{route="/users/{id}",tier="remote",result="%s"}'
+    assert pending[lookups % "hit"] == 1
+    assert pending[lookups % "miss"] == 1
+    assert pending['cache_value_bytes_count{route="/users/{id}"}'] == 1
+    assert pending['cache_backend_seconds_count{route="/users/{id}",op="get"}'] == 2
+
+
+async def test_metrics_endpoint(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    Metrics.inc("cache_lookups_total", route="a")
+
+    assert (await client.get("/metrics")).status_code == 404
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "secret")
+    assert (await client.get("/metrics")).status_code == 404
+    r = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("text/plain")
+    assert "# TYPE cache_lookups_total counter" in r.text
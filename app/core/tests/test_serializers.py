@@ -0,0 +1,58 @@
+import pickle
+
+import pytest
+
+from app.core.serializers import CODECS, COMPRESSORS, Serializer, SerializerException
+
+pytestmark = pytest.mark.anyio
+
+# the optional modules behind each codec and compressor
+MODULES = {"msgpack": "msgpack", "zstd": "zstandard", "lz4": "lz4.frame"}
+
+
+@pytest.mark.parametrize("codec", ["pickle", "orjson", "msgpack"])
+def test_serializer_roundtrip(codec: str) -> None:
+    if codec in MODULES:
+        pytest.importorskip(MODULES[codec])
+    value = {"email": "user@example.com", "is_active": True, "ids": [1, 2, 3]}
+    serializer = Serializer(codec)
+
+    assert Serializer.loads(serializer.dumps(value)) == value
+
+
+@pytest.mark.parametrize("compression", ["zstd", "lz4"])
+def test_serializer_compression(compression: str) -> None:
+    pytest.importorskip(MODULES[compression])
+    value = {"ids": list(range(1000))}
+    serializer = Serializer("orjson", compression, threshold=100)
+
+    data = serializer.dumps(value)
+    # low nibble the codec, high nibble the compressor
+    assert data[0] & 0x0F == CODECS["orjson"].id
+    assert data[0] >> 4 == COMPRESSORS[compression].id
+    assert len(data) < len(Serializer("orjson").dumps(value))
+    assert Serializer.loads(data) == value
+
+    small = serializer.dumps([1])
+    assert small[0] >> 4 == 0
+    assert Serializer.loads(small) == [1]
+
+
+def test_serializer_reads_legacy_pickle() -> None:
+    value = {"legacy": True}
+
+    assert Serializer.loads(pickle.dumps(value)) == value
+
+
+def test_serializer_reads_mixed_codecs() -> None:
+    value = ["a", "b"]
+    pickled = Serializer("pickle").dumps(value)
+    jsoned = Serializer("orjson").dumps(value)
+
+    assert pickled[0] != jsoned[0]
+    assert Serializer.loads(pickled) == Serializer.loads(jsoned) == value
+
+
+def test_serializer_unknown_codec() -> None:
+    with pytest.raises(SerializerException):
+        Serializer("unknown")
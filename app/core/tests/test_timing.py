@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi.responses import PlainTextResponse
+from httpx import AsyncClient
+from starlette.types import Receive, Scope, Send
+
+from app.core import timing
+from app.core.timing import Timing, TimingMiddleware, span
+
+pytestmark = pytest.mark.anyio
+
+
+def test_span_without_timing() -> None:
+    with span("db"):
+        pass
+
+    assert timing.get_timing() is None
+
+
+async def test_span() -> None:
+    current = Timing()
+    token = timing._timing.set(current)
+    try:
+        with span("db"):
+            # not counted twice
+            with span("db"):
+                await asyncio.sleep(0.01)
+        with span("db"), span("cache"):
+            pass
+    finally:
+        timing._timing.reset(token)
+
+    assert current.counts == {"db": 2, "cache": 1}
+    assert current.spans["db"] >= 0.01
+    fields = current.fields()
+    assert fields["db_count"] == 2
+    assert fields["total_ms"] >= fields["db_ms"]
+    assert current.header().decode().startswith("db;dur=")
+
+
+async def test_timing_middleware(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+        with span("db"):
+            await asyncio.sleep(0.01)
+        if scope["path"] == "/exposed":
+            timing.expose()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    caplog.set_level(logging.INFO, logger=timing.__name__)
+    app = TimingMiddleware(endpoint, log_threshold=0.01)
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        hidden = await client.get("/hidden")
+        exposed = await client.get("/exposed")
+        monkeypatch.setattr(timing.settings, "SERVER_TIMING", True)
+        debug = await client.get("/debug")
+
+    assert "Server-Timing" not in hidden.headers
+    for r in (exposed, debug):
+        db, total = r.headers["Server-Timing"].split(", ")
+        assert db.startswith("db;dur=")
+        assert total.startswith("total;dur=")
+
+    records = [r for r in caplog.records if r.name == timing.__name__]
+    assert len(records) == 3
+    assert records[0].levelno == logging.INFO
+    assert records[0].getMessage().startswith("Slow request GET /hidden 200 db_ms=")
+    assert records[0].timing["db_count"] == 1  # type: ignore[attr-defined]
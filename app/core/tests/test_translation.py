@@ -0,0 +1,72 @@
+import gettext
+from collections.abc import Iterator
+
+import orjson
+import pytest
+
+from app.auth.exceptions import AuthException
+from app.core import translation
+from app.core.exceptions import ApiException
+from app.core.translation import gettext_lazy, negotiate
+
+
+@pytest.mark.parametrize(
+    ("accept_language", "expected"),
+    [
+        ("tr", "tr"),
+        ("tr-TR,tr;q=0.9,en;q=0.8", "tr"),
+        ("de-DE,de;q=0.9,en-US;q=0.8", "en"),
+        ("en;q=0.5, tr;q=0.8", "tr"),
+        ("TR-tr", "tr"),
+        ("*", "en"),
+        ("*, en;q=0", "tr"),
+        ("tr;q=0, en;q=0", None),
+        ("de", None),
+        ("tr;q=abc, en", "en"),
+        ("", None),
+    ],
+)
+def test_negotiate(accept_language: str, expected: str | None) -> None:
+    assert negotiate(accept_language) == expected
+
+
+class UpperCatalog(gettext.NullTranslations):
+    def gettext(self, message: str) -> str:
+        return message.upper()
+
+
+@pytest.fixture
+def tr(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    translation.load_catalogs()
+    monkeypatch.setitem(translation._catalogs, "tr", UpperCatalog())
+    token = translation._lang.set("tr")
+    yield
+    translation._lang.reset(token)
+
+
+@pytest.mark.usefixtures("tr")
+def test_gettext() -> None:
+    assert translation.gettext("User is not found") == "USER IS NOT FOUND"
+
+    translation.activate("xx")
+    assert translation.gettext("User is not found") == "User is not found"
+
+
+@pytest.mark.usefixtures("tr")
+def test_lazy_string() -> None:
+    message = gettext_lazy("User is not found")
+
+    assert message == gettext_lazy("User is not found")
+    assert str(message) == "USER IS NOT FOUND"
+    translation.activate("en")
+    assert str(message) == "User is not found"
+
+
+@pytest.mark.usefixtures("tr")
+def test_api_exception_is_translated_when_rendered() -> None:
+    response = AuthException.user_not_found.to_response()
+
+    assert orjson.loads(response.body)["message"] == "USER IS NOT FOUND"
+    assert AuthException.user_not_found == ApiException(
+        "USER IS NOT FOUND", 400, "auth", "user_not_found"
+    )
@@ -0,0 +1,173 @@
+import logging
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, ParamSpec, TypeVar
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+DB_METHODS = (
+    "execute_insert",
+    "execute_many",
+    "execute_query",
+    "execute_query_dict",
+    "execute_script",
+)
+
+
+class Timing:
+    """Seconds spent in each phase of a request."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: dict[str, float] = {}
+        self.counts: Counter[str] = Counter()
+        self.expose = settings.SERVER_TIMING
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+        self.counts[name] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> bytes:
+        items = [f"{name};dur={sec * 1000:.1f}" for name, sec in self.spans.items()]
+        items.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(items).encode()
+
+    def fields(self) -> dict[str, float]:
+        fields: dict[str, float] = {}
+        for name, seconds in self.spans.items():
+            fields[f"{name}_ms"] = round(seconds * 1000, 1)
+            fields[f"{name}_count"] = self.counts[name]
+        fields["total_ms"] = round(self.elapsed() * 1000, 1)
+        return fields
+
+
+_timing: ContextVar[Timing | None] = ContextVar("timing", default=None)
+_span: ContextVar[str] = ContextVar("span", default="")
+
+
+def get_timing() -> Timing | None:
+    return _timing.get()
+
+
+def expose() -> None:
+    """Send the Server-Timing header for the current request."""
+    timing = _timing.get()
+    if timing is not None:
+        timing.expose = True
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's `name` phase.
+
+    Blocks nested in a span of the same name are not counted twice.
+    """
+    timing = _timing.get()
+    if timing is None or _span.get() == name:
+        yield
+        return
+
+    token = _span.set(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+        _span.reset(token)
+
+
+def timed(name: str, func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        with span(name):
+            return await func(*args, **kwargs)
+
+    wrapper.timed = True  # type: ignore[attr-defined]
+    return wrapper
+
+
+def instrument_db() -> None:
+    """Time the queries of every loaded Tortoise client class as `db`.
+
+    Tortoise has no query hooks, so this wraps the execute methods of the
+    client classes, which are only imported once Tortoise is initialized.
+    """
+    classes: list[type] = [BaseDBAsyncClient]
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        for method in DB_METHODS:
+            func = cls.__dict__.get(method)
+            if func is not None and not hasattr(func, "timed"):
+                setattr(cls, method, timed("db", func))
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with span("render"):
+            return super().render(content)
+
+
+class TimingMiddleware:
+    """Time each request and the phases recorded with `span`.
+
+    The phases are sent in a Server-Timing header when SERVER_TIMING is set or
+    the request `expose`s them, as authenticating a superuser does. Requests
+    slower than SLOW_REQUEST_THRESHOLD seconds are logged with the phases as
+    extra `timing` fields.
+    """
+
+    def __init__(
+        self, app: ASGIApp, log_threshold: float = settings.SLOW_REQUEST_THRESHOLD
+    ) -> None:
+        self.app = app
+        self.log_threshold = log_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = Timing()
+        token = _timing.set(timing)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timing.expose:
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (b"server-timing", timing.header()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timing.reset(token)
+            if timing.elapsed() >= self.log_threshold:
+                fields = timing.fields()
+                phases = " ".join(f"{key}={value}" for key, value in fields.items())
+                logger.info(
+                    f"Slow request {scope['method']} {scope['path']} {status} "
+                    f"{phases}",
+                    extra={"timing": fields},
+                )
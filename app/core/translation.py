@@ -1,9 +1,64 @@
 import gettext as gettext_module
+from collections.abc import Iterator
+from contextlib import contextmanager
 from contextvars import ContextVar
+from functools import lru_cache
 
 from app.core.config import settings
 
+DOMAIN = "messages"
+LOCALE_DIR = "locale"
+
 _lang: ContextVar[str] = ContextVar[str]("language", default=settings.DEFAULT_LOCALE)
+_catalogs: dict[str, gettext_module.NullTranslations] = {}
+
+
+def _parse_accept_language(accept_language: str) -> tuple[list[str], set[str]]:
+    """Return the ranges by descending q-value and the ones with q=0."""
+    ranges = []
+    excluded = set()
+    for i, item in enumerate(accept_language.split(",")):
+        tag, _, params = item.partition(";")
+        tag = tag.strip().lower()
+        name, _, value = params.strip().partition("=")
+        try:
+            q = float(value) if name.strip() == "q" else 1.0
+        except ValueError:
+            continue
+        if q <= 0:
+            excluded.add(tag)
+        elif tag:
+            ranges.append((-q, i, tag))
+    return [tag for _, _, tag in sorted(ranges)], excluded
+
+
+@lru_cache(maxsize=1024)
+def negotiate(accept_language: str) -> str | None:
+    """Pick the best of `settings.LOCALES` for an Accept-Language value.
+
+    Ranges are tried by descending q-value. Each one matches a locale it is a
+    prefix of, then falls back to shorter ranges, like `tr-TR` to `tr` (RFC
+    4647 lookup). Returns None if nothing is acceptable. Memoized, since a few
+    header values make up most requests.
+    """
+    ranges, excluded = _parse_accept_language(accept_language)
+    locales = {
+        locale.lower(): locale
+        for locale in settings.LOCALES
+        if locale.lower() not in excluded
+    }
+    for tag in ranges:
+        if tag == "*":
+            default = settings.DEFAULT_LOCALE.lower()
+            return locales.get(default) or next(iter(locales.values()), None)
+        while tag:
+            if tag in locales:
+                return locales[tag]
+            for key, locale in locales.items():
+                if key.startswith(f"{tag}-"):
+                    return locale
+            tag = tag.rpartition("-")[0]
+    return None
 
 
 def activate(lang: str) -> None:
@@ -14,7 +69,68 @@ def get_language() -> str:
     return _lang.get()
 
 
+@contextmanager
+def override(lang: str) -> Iterator[None]:
+    """Translate to `lang` in the block, like for an email to another user."""
+    token = _lang.set(lang)
+    try:
+        yield
+    finally:
+        _lang.reset(token)
+
+
+def load_catalogs() -> None:
+    """Read the compiled catalog of every locale in `settings.LOCALES`."""
+    for locale in settings.LOCALES:
+        _catalogs[locale] = gettext_module.translation(
+            DOMAIN, localedir=LOCALE_DIR, languages=[locale]
+        )
+
+
+def _get_catalog() -> gettext_module.NullTranslations | None:
+    if not _catalogs:
+        load_catalogs()
+    return _catalogs.get(get_language())
+
+
 def gettext(message: str) -> str:
-    return gettext_module.translation(
-        "messages", localedir="locale", languages=[get_language()]
-    ).gettext(message)
+    catalog = _get_catalog()
+    return catalog.gettext(message) if catalog is not None else message
+
+
+def ngettext(singular: str, plural: str, n: int) -> str:
+    catalog = _get_catalog()
+    if catalog is None:
+        return singular if n == 1 else plural
+    return catalog.ngettext(singular, plural, n)
+
+
+class LazyString:
+    """A message translated to the active language whenever it is rendered.
+
+    For messages defined at import time, like the values of exception enums,
+    which would otherwise be frozen in the default language.
+    """
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+    def __str__(self) -> str:
+        return gettext(self.message)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.message!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyString):
+            return self.message == other.message
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.message)
+
+
+def gettext_lazy(message: str) -> LazyString:
+    return LazyString(message)
@@ -1,35 +1,42 @@
 import sentry_sdk
-from fastapi import Depends, FastAPI
-from fastapi.responses import ORJSONResponse
+from fastapi import FastAPI
 from tortoise.contrib.fastapi import register_tortoise
 
+from app.core import translation
 from app.core.api import router
+from app.core.cache import Cache
 from app.core.config import TORTOISE_CONFIG, Environment, settings
 from app.core.exceptions import setup_exception_handlers
-from app.core.limiter import RateLimiter
+from app.core.logs import sentry_before_send, setup_logging
+from app.core.timing import TimedORJSONResponse, instrument_db
 from app.middlewares import setup_middlewares
+from app.utils.emails import EmailTemplates
+
+if settings.ENVIRONMENT != Environment.test:
+    setup_logging()
 
 if settings.SENTRY_DSN:
     sentry_sdk.init(
         dsn=settings.SENTRY_DSN,
         environment=settings.ENVIRONMENT.name,
         traces_sample_rate=0.0,
+        before_send=sentry_before_send,
     )
 
-global_dependencies = []
-if settings.ENVIRONMENT > Environment.test:
-    global_dependencies.append(Depends(RateLimiter(times=100, seconds=60)))
-
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url="/openapi.json",
-    default_response_class=ORJSONResponse,
-    dependencies=global_dependencies,
+    default_response_class=TimedORJSONResponse,
 )
 
 
 app.include_router(router)
 
+app.add_event_handler("startup", translation.load_catalogs)
+app.add_event_handler("startup", EmailTemplates.load)
+app.add_event_handler("startup", Cache.startup)
+app.add_event_handler("shutdown", Cache.shutdown)
+
 setup_middlewares(app)
 
 setup_exception_handlers(app)
@@ -40,3 +47,5 @@ register_tortoise(
     generate_schemas=True,
     add_exception_handlers=True,
 )
+# after register_tortoise, which loads the database clients on startup
+app.add_event_handler("startup", instrument_db)
@@ -1,43 +1,254 @@
+import logging
+import random
+import re
+import uuid
+from urllib.parse import parse_qs
+
 import secure
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
-from app.core import translation
+from app.auth.deps import get_token_user_id
+from app.core import logs, timing, translation
+from app.core.admission import AdaptiveLimit, AdmissionMiddleware, AdmissionRule
+from app.core.compression import CompressionMiddleware
 from app.core.config import Environment, settings
+from app.core.deps import get_ip_string
+from app.core.limiter import RateLimiter, RateLimitMiddleware, RateLimitRule
+from app.core.timing import TimingMiddleware
+
+# the first rule matching a request applies
+rate_limit_rules = [
+    RateLimitRule(
+        f"{settings.API_PATH}/auth/login",
+        RateLimiter(times=10, minutes=1, algorithm="sliding_window"),
+        methods=["POST"],
+    ),
+    RateLimitRule(
+        f"{settings.API_PATH}/auth/register",
+        RateLimiter(times=5, hours=1, algorithm="sliding_window"),
+        methods=["POST"],
+    ),
+    # one bucket per user or IP shared by all other routes, as the key has the
+    # rule's template: a client gets 100 requests a minute in total, not per route
+    RateLimitRule(
+        "/{path:path}",
+        RateLimiter(times=100, seconds=60, algorithm="gcra", by_user=get_token_user_id),
+    ),
+]
+
+# per worker; login and register share one limit since both run Argon2
+argon2_limit = AdaptiveLimit(
+    "argon2", limit=8, min_limit=2, max_limit=32, queue_size=16
+)
+admission_rules = [
+    AdmissionRule(f"{settings.API_PATH}/auth/login", argon2_limit, methods=["POST"]),
+    AdmissionRule(f"{settings.API_PATH}/auth/register", argon2_limit, methods=["POST"]),
+    AdmissionRule("/{path:path}", AdaptiveLimit("default")),
+]
+
+
+class SecureHeadersMiddleware:
+    """Add security headers that the response does not set itself."""
+
+    headers = [
+        (name.lower().encode(), value.encode())
+        for name, value in secure.Secure(server=secure.Server()).headers().items()
+    ]
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                names = {name.lower() for name, _ in headers}
+                headers.extend(h for h in self.headers if h[0] not in names)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
-class SecureHeadersMiddleware(BaseHTTPMiddleware):
-    secure_headers = secure.Secure(server=secure.Server())
+class LocaleMiddleware:
+    """Activate the locale negotiated from Accept-Language.
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        response = await call_next(request)
-        self.secure_headers.framework.fastapi(response)
-        return response
+    A `lang` query parameter or cookie takes precedence. Responses vary on
+    Accept-Language only, so shared caches do not see the cookie; cacheable
+    URLs should use the query parameter.
+    """
 
+    content_language = {
+        lang: (b"content-language", lang.encode()) for lang in settings.LOCALES
+    }
+    vary = b"Accept-Language"
 
-class LocaleMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        lang = request.headers.get("Accept-Language", settings.DEFAULT_LOCALE)
-        if lang not in settings.LOCALES:
-            lang = settings.DEFAULT_LOCALE
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    @staticmethod
+    def get_language(scope: Scope) -> str:
+        query_string = scope.get("query_string", b"")
+        if b"lang=" in query_string:
+            for requested in parse_qs(query_string.decode("latin-1")).get("lang", ()):
+                lang = translation.negotiate(requested)
+                if lang is not None:
+                    return lang
+
+        accept_language = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-language":
+                accept_language = value.decode("latin-1")
+            elif name == b"cookie" and b"lang=" in value:
+                cookie = cookie_parser(value.decode("latin-1")).get("lang")
+                lang = translation.negotiate(cookie) if cookie else None
+                if lang is not None:
+                    return lang
+        return translation.negotiate(accept_language) or settings.DEFAULT_LOCALE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lang = self.get_language(scope)
         translation.activate(lang)
-        response = await call_next(request)
-        response.headers["Content-Language"] = lang
-        return response
+        header = self.content_language[lang]
+
+        async def send_with_language(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", ()), header]
+                for i, (name, value) in enumerate(headers):
+                    if name.lower() == b"vary":
+                        if self.vary.lower() not in value.lower():
+                            headers[i] = (name, value + b", " + self.vary)
+                        break
+                else:
+                    headers.append((b"vary", self.vary))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_language)
+
+
+class RequestIdMiddleware:
+    """Take the request id from X-Request-ID or generate one.
+
+    It is kept in the `request_id` contextvar for log records, Sentry events
+    and outgoing requests, and echoed in the response.
+    """
+
+    header = b"x-request-id"
+    pattern = re.compile(r"[\w.-]{1,128}")
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = ""
+        for name, value in scope["headers"]:
+            if name == self.header:
+                rid = value.decode("latin-1")
+                break
+        if not self.pattern.fullmatch(rid):
+            rid = uuid.uuid4().hex
+        token = logs.request_id.set(rid)
+        header = (self.header, rid.encode())
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logs.request_id.reset(token)
+
+
+class AccessLogMiddleware:
+    """Log each request to `app.access`, with its timings as extra fields.
+
+    Responses with a status below 400 are logged with probability
+    ACCESS_LOG_SAMPLE_RATE.
+    """
+
+    logger = logging.getLogger("app.access")
+
+    def __init__(
+        self, app: ASGIApp, sample_rate: float = settings.ACCESS_LOG_SAMPLE_RATE
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_with_log(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_log)
+        finally:
+            sampled = random.random() < self.sample_rate  # noqa: S311
+            if status >= 400 or sampled:
+                self.log(scope, status, size)
+
+    @classmethod
+    def log(cls, scope: Scope, status: int, size: int) -> None:
+        request = Request(scope)
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "bytes": size,
+            "client": get_ip_string(request),
+            "user_agent": request.headers.get("user-agent", ""),
+        }
+        current = timing.get_timing()
+        if current is not None:
+            fields.update(current.fields())
+        cls.logger.info(
+            f'{fields["client"]} "{scope["method"]} {scope["path"]} '
+            f'HTTP/{scope["http_version"]}" {status}',
+            extra=fields,
+        )
 
 
 def setup_middlewares(app: FastAPI) -> None:
     app.add_middleware(LocaleMiddleware)
 
+    if settings.ENVIRONMENT > Environment.test:
+        # still before routing, but inside CORS and the security headers so
+        # that browsers can read 429 and 503 responses, and CORS preflights
+        # are answered without being counted
+        app.add_middleware(RateLimitMiddleware, rules=rate_limit_rules)
+        app.add_middleware(AdmissionMiddleware, rules=admission_rules)
+
     if settings.ALLOWED_HOSTS:
         app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.ALLOWED_HOSTS)
 
@@ -51,7 +262,13 @@ def setup_middlewares(app: FastAPI) -> None:
         )
 
     if settings.ENVIRONMENT > Environment.test:
-        app.add_middleware(GZipMiddleware)
+        app.add_middleware(CompressionMiddleware)
         app.add_middleware(HTTPSRedirectMiddleware)
         app.add_middleware(SecureHeadersMiddleware)
         app.add_middleware(ProxyHeadersMiddleware)
+
+    # outermost, so that the other middlewares are timed too and everything
+    # is logged with the request id
+    app.add_middleware(AccessLogMiddleware)
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(RequestIdMiddleware)
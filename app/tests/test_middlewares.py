@@ -0,0 +1,174 @@
+import logging
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient
+from starlette.types import Receive, Scope, Send
+
+from app import middlewares
+from app.core import logs, translation
+from app.core.admission import AdaptiveLimit, AdmissionRule
+from app.core.backends import MemoryBackend
+from app.core.cache import Cache
+from app.core.config import Environment, settings
+from app.core.limiter import RateLimiter, RateLimitRule
+from app.core.logs import RequestIdFilter
+from app.middlewares import (
+    AccessLogMiddleware,
+    LocaleMiddleware,
+    RequestIdMiddleware,
+    SecureHeadersMiddleware,
+    setup_middlewares,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/language")
+    async def language(response: Response) -> str:
+        response.headers["Cache-Control"] = "max-age=60"
+        return translation.get_language()
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        return StreamingResponse(iter([b"a", b"b"]))
+
+    app.add_middleware(LocaleMiddleware)
+    app.add_middleware(SecureHeadersMiddleware)
+    return app
+
+
+async def test_secure_headers(app: FastAPI) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r = await client.get("/language")
+        streamed = await client.get("/stream")
+
+    assert r.headers["X-Content-Type-Options"] == "nosniff"
+    assert r.headers["X-Frame-Options"] == "SAMEORIGIN"
+    # set by the endpoint, so not replaced with no-store
+    assert r.headers.get_list("Cache-Control") == ["max-age=60"]
+    assert streamed.text == "ab"
+    assert streamed.headers["Cache-Control"] == "no-store"
+
+
+async def test_locale(app: FastAPI) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        tr = await client.get(
+            "/language", headers={"Accept-Language": "tr-TR,tr;q=0.9,en;q=0.8"}
+        )
+        unknown = await client.get("/language", headers={"Accept-Language": "xx"})
+
+    assert tr.json() == "tr"
+    assert tr.headers["Content-Language"] == "tr"
+    assert tr.headers["Vary"] == "Accept-Language"
+    assert unknown.json() == "en"
+    assert unknown.headers["Content-Language"] == "en"
+
+
+async def test_locale_override(app: FastAPI) -> None:
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        headers = {"Accept-Language": "en"}
+        query = await client.get("/language?lang=tr", headers=headers)
+        client.cookies.set("lang", "tr")
+        cookie = await client.get("/language", headers=headers)
+        invalid = await client.get("/language?lang=xx", headers=headers)
+
+    assert query.json() == "tr"
+    assert cookie.json() == "tr"
+    # falls back to the cookie
+    assert invalid.json() == "tr"
+
+
+async def test_locale_vary_is_merged(app: FastAPI) -> None:
+    @app.get("/varied")
+    async def varied(response: Response) -> None:
+        response.headers["Vary"] = "Authorization"
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        r = await client.get("/varied")
+
+    assert r.headers.get_list("Vary") == ["Authorization, Accept-Language"]
+
+
+async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    logging.getLogger("app.test").info("handled")
+    status = 404 if scope["path"] == "/missing" else 200
+    await PlainTextResponse(logs.request_id.get(), status)(scope, receive, send)
+
+
+async def test_request_id_middleware(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.INFO)
+    caplog.handler.addFilter(RequestIdFilter())
+    app = RequestIdMiddleware(endpoint)
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        given = await client.get("/", headers={"X-Request-ID": "abc-123"})
+        generated = await client.get("/")
+        invalid = await client.get("/", headers={"X-Request-ID": "a b"})
+
+    assert given.text == given.headers["X-Request-ID"] == "abc-123"
+    assert len(generated.headers["X-Request-ID"]) == 32
+    assert generated.text == generated.headers["X-Request-ID"]
+    assert invalid.headers["X-Request-ID"] != "a b"
+    assert caplog.records[0].request_id == "abc-123"  # type: ignore[attr-defined]
+    assert logs.request_id.get() == ""
+
+
+async def test_access_log_middleware(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.INFO, logger="app.access")
+    app = AccessLogMiddleware(endpoint, sample_rate=0)
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        await client.get("/")
+        await client.get("/missing", headers={"User-Agent": "test"})
+
+    records = [r for r in caplog.records if r.name == "app.access"]
+    # successful requests are not sampled
+    assert len(records) == 1
+    assert records[0].getMessage() == '127.0.0.1 "GET /missing HTTP/1.1" 404'
+    assert records[0].status == 404  # type: ignore[attr-defined]
+    assert records[0].user_agent == "test"  # type: ignore[attr-defined]
+
+
+async def test_rejections_have_cors_and_secure_headers(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(Cache, "backend", MemoryBackend())
+    monkeypatch.setattr(Cache, "local", None)
+    monkeypatch.setattr(settings, "ENVIRONMENT", Environment.production)
+    monkeypatch.setattr(settings, "CORS_ORIGINS", ["https://example.com"])
+    monkeypatch.setattr(
+        middlewares,
+        "rate_limit_rules",
+        [RateLimitRule("/{path:path}", RateLimiter(times=1, minutes=1))],
+    )
+    overloaded = AdaptiveLimit("overloaded", limit=0, min_limit=0, queue_size=0)
+    monkeypatch.setattr(
+        middlewares, "admission_rules", [AdmissionRule("/overloaded", overloaded)]
+    )
+    app = FastAPI()
+
+    @app.get("/limited")
+    async def limited_route() -> None:
+        pass
+
+    setup_middlewares(app)
+    origin = {"Origin": "https://example.com"}
+    preflight = {**origin, "Access-Control-Request-Method": "GET"}
+    async with AsyncClient(app=app, base_url="https://testserver") as client:
+        for _ in range(3):
+            assert (await client.options("/limited", headers=preflight)).is_success
+        allowed = await client.get("/limited", headers=origin)
+        limited = await client.get("/limited", headers=origin)
+        shed = await client.get("/overloaded", headers=origin)
+
+    assert allowed.status_code == 200
+    assert limited.status_code == 429
+    assert shed.status_code == 503
+    for r in (limited, shed):
+        assert r.headers["Access-Control-Allow-Origin"] == "https://example.com"
+        assert r.headers["X-Frame-Options"] == "SAMEORIGIN"
+    assert "Retry-After" in limited.headers
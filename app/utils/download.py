@@ -1,10 +1,10 @@
 from pathlib import Path
 
-import aiohttp
+from app.core.logs import client_session
 
 
 async def download_file(url: str, path: Path) -> None:
-    async with aiohttp.ClientSession() as session:
+    async with client_session() as session:
         async with session.get(url) as res:
             res.raise_for_status()
 
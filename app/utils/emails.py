@@ -2,9 +2,45 @@ import logging
 from typing import Any
 
 import emails
-from emails.template import JinjaTemplate
+import jinja2
 
+from app.core import translation
 from app.core.config import Environment, settings
+from app.core.translation import LazyString
+
+logger = logging.getLogger(__name__)
+
+
+class EmailTemplates:
+    """The templates in templates/email/build, each compiled once.
+
+    Translations are looked up when a template is rendered, so one compiled
+    template serves every locale: `_()` in a template and lazy strings in the
+    context follow the active language. In local, templates are recompiled
+    when their file changes.
+    """
+
+    directory = "templates/email/build"
+    environment = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=jinja2.select_autoescape(["html"]),
+        auto_reload=settings.ENVIRONMENT == Environment.local,
+        cache_size=-1,
+        extensions=["jinja2.ext.i18n"],
+    )
+    environment.install_gettext_callables(  # type: ignore[attr-defined]
+        translation.gettext, translation.ngettext, newstyle=True
+    )
+
+    @classmethod
+    def load(cls) -> None:
+        """Compile every template up front instead of on the first email."""
+        for name in cls.environment.list_templates(extensions=["html"]):
+            cls.environment.get_template(name)
+
+    @classmethod
+    def render(cls, template_name: str, context: dict[str, Any]) -> str:
+        return cls.environment.get_template(f"{template_name}.html").render(context)
 
 
 class EmailSender:
@@ -20,34 +56,40 @@ class EmailSender:
     def send_html_email(
         cls,
         recipients: list[str],
-        subject: str,
+        subject: str | LazyString,
         template_name: str,
         context: dict[str, Any] | None = None,
+        lang: str | None = None,
     ) -> None:
-        with open(f"templates/email/build/{template_name}.html") as f:
-            template = f.read()
+        """Send a template from EmailTemplates in `lang`, by default the
+        language of the current request."""
+        lang = lang or translation.get_language()
+        with translation.override(lang):
+            html = EmailTemplates.render(
+                template_name, {"lang": lang, **(context or {})}
+            )
+            subject = str(subject)
 
-        cls.send_email(recipients, subject, "", template, context)
+        cls.send_email(recipients, subject, "", html)
 
     @classmethod
     def send_email(
         cls,
         recipients: list[str],
-        subject_template: str,
-        text_template: str,
-        html_template: str,
-        context: dict[str, Any] | None = None,
+        subject: str,
+        text: str,
+        html: str,
     ) -> None:
         message = emails.Message(
-            subject=JinjaTemplate(f"[{settings.PROJECT_NAME}] {subject_template}"),
-            text=JinjaTemplate(text_template),
-            html=JinjaTemplate(html_template),
+            subject=f"[{settings.PROJECT_NAME}] {subject}",
+            text=text,
+            html=html,
             mail_from=settings.EMAIL_FROM,
         )
         if settings.ENVIRONMENT > Environment.test:
-            res = message.send(to=recipients, render=context, smtp=cls.options)
+            res = message.send(to=recipients, smtp=cls.options)
             res.raise_if_needed()
         elif settings.ENVIRONMENT == Environment.test:
             pass
         else:
-            logging.info(message.html_body)
+            logger.info(message.html_body)
@@ -10,6 +10,7 @@ from passlib.context import CryptContext
 from app.auth import models
 from app.auth.exceptions import AuthException
 from app.auth.schemas import AccessToken, RefreshAccessToken
+from app.core import timing
 from app.core.config import settings
 
 ALGORITHM = "HS256"
@@ -29,11 +30,13 @@ async def authenticate(credentials: OAuth2PasswordRequestForm) -> models.User |
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return PWD_CONTEXT.verify(plain_password, hashed_password)
+    with timing.span("hash"):
+        return PWD_CONTEXT.verify(plain_password, hashed_password)
 
 
 def hash_password(password: str) -> str:
-    return PWD_CONTEXT.hash(password)
+    with timing.span("hash"):
+        return PWD_CONTEXT.hash(password)
 
 
 async def create_auth_tokens(user_id: int) -> RefreshAccessToken:
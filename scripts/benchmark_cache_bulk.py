@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from app.core.cache import Cache
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+
+async def timed(func: Callable[[], Awaitable[object]], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await func()
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+async def main(count: int, rounds: int) -> None:
+    keys = [f"benchmark:bulk:{i}" for i in range(count)]
+    items = {key: {"id": i, "name": f"user {i}"} for i, key in enumerate(keys)}
+
+    async def set_per_key() -> None:
+        for key, value in items.items():
+            await Cache.set(key, value, timeout=60)
+
+    async def get_per_key() -> None:
+        await asyncio.gather(*[Cache.get(key) for key in keys])
+
+    async def delete_per_key() -> None:
+        await asyncio.gather(*[Cache.backend.delete_many([key]) for key in keys])
+
+    benchmarks = [
+        ("set", set_per_key, lambda: Cache.set_many(items, timeout=60)),
+        ("get", get_per_key, lambda: Cache.get_many(keys)),
+        ("delete", delete_per_key, lambda: Cache.delete_many(keys)),
+    ]
+
+    logger.info(f"{count} keys, {rounds} rounds, chunk size {Cache.chunk_size}")
+    logger.info(f"{'operation':<12}{'per-key ms':>12}{'bulk ms':>12}{'speedup':>10}")
+    for name, per_key, bulk in benchmarks:
+        await Cache.set_many(items, timeout=60)
+        per_key_ms = await timed(per_key, rounds)
+        await Cache.set_many(items, timeout=60)
+        bulk_ms = await timed(bulk, rounds)
+        logger.info(
+            f"{name:<12}{per_key_ms:>12.2f}{bulk_ms:>12.2f}"
+            f"{per_key_ms / bulk_ms:>9.1f}x"
+        )
+
+    await Cache.delete_many(keys)
+    await Cache.backend.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bulk cache operations")
+    parser.add_argument("--count", type=int, default=200, help="keys per batch")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.rounds))
@@ -0,0 +1,61 @@
+import argparse
+import logging
+import timeit
+from functools import partial
+from typing import Any
+
+from emails.template import JinjaTemplate
+
+from app.core import translation
+from app.core.config import settings
+from app.core.translation import gettext_lazy as _
+from app.utils.emails import EmailTemplates
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+
+def make_context(lang: str) -> dict[str, Any]:
+    subject = _("Password Reset")
+    return {
+        "lang": lang,
+        "subject": subject,
+        "title": subject,
+        "heading": "",
+        "button": _("Reset My Password"),
+        "url": f"{settings.CLIENT_URL}/reset-password?token=token",
+    }
+
+
+def render_from_disk(template_name: str, context: dict[str, Any]) -> str:
+    # what EmailSender did before the registry: read and compile on every send
+    with open(f"{EmailTemplates.directory}/{template_name}.html") as f:
+        template = JinjaTemplate(f.read())
+    return template.render(**context)
+
+
+def main(template_name: str, number: int) -> None:
+    EmailTemplates.load()
+
+    logger.info(f"{'locale':<8}{'renderer':<12}{'us/render':>12}{'renders/s':>12}")
+    for lang in settings.LOCALES:
+        context = make_context(lang)
+        renderers = {
+            "disk": partial(render_from_disk, template_name, context),
+            "registry": partial(EmailTemplates.render, template_name, context),
+        }
+        with translation.override(lang):
+            for name, render in renderers.items():
+                seconds = timeit.timeit(render, number=number)
+                logger.info(
+                    f"{lang:<8}{name:<12}{seconds / number * 1e6:>12.1f}"
+                    f"{number / seconds:>12.0f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark email rendering")
+    parser.add_argument("--template", default="password-reset")
+    parser.add_argument("--number", type=int, default=1000, help="iterations")
+    args = parser.parse_args()
+    main(args.template, args.number)
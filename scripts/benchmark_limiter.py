@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from app.core.backends import RedisBackend
+from app.core.config import settings
+from app.core.limiter import RateLimiter
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+
+async def main(url: str, requests: int, clients: int, limit: int, seconds: int) -> None:
+    backend = RedisBackend(url)
+    client = backend.client
+    args = [str(limit), str(seconds * 1000), "1"]
+
+    logger.info(
+        f"{requests} requests from {clients} clients, {limit} per {seconds}s, "
+        "server time is from INFO commandstats"
+    )
+    logger.info(
+        f"{'algorithm':<16}{'server us':>11}{'client us':>11}"
+        f"{'bytes/key':>11}{'allowed':>9}"
+    )
+    for name, script in RateLimiter.scripts.items():
+        keys = [f"benchmark:limiter:{name}:{i}" for i in range(clients)]
+        await client.delete(*keys)
+        # load the script first so that only EVALSHA calls are counted
+        await backend.run_script(script, keys[:1], args)
+        await client.delete(*keys)
+        await client.config_resetstat()
+
+        allowed = 0
+        started = time.perf_counter()
+        for i in range(requests):
+            ret = await backend.run_script(script, [keys[i % clients]], args)
+            allowed += ret[0]
+        client_us = (time.perf_counter() - started) / requests * 1_000_000
+
+        stats = (await client.info("commandstats"))["cmdstat_evalsha"]
+        memory = [await client.memory_usage(key) or 0 for key in keys]
+        logger.info(
+            f"{name:<16}{stats['usec_per_call']:>11.2f}{client_us:>11.2f}"
+            f"{sum(memory) / clients:>11.0f}{allowed:>9}"
+        )
+        await client.delete(*keys)
+
+    await backend.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the Redis cost of rate limiting algorithms"
+    )
+    parser.add_argument("--url", default=settings.CACHE_URI, help="Redis URL")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=60)
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("--url or CACHE_URI is required")
+    asyncio.run(main(args.url, args.requests, args.clients, args.limit, args.seconds))
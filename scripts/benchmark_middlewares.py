@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any
+
+from fastapi import FastAPI
+
+from app.core.backends import MemoryBackend
+from app.core.cache import Cache
+from app.core.config import Environment, settings
+from app.middlewares import setup_middlewares
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+
+def make_app(middlewares: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping() -> dict[str, bool]:
+        return {"ok": True}
+
+    if middlewares:
+        setup_middlewares(app)
+    return app
+
+
+async def request(app: FastAPI, client: str) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "https",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"accept-language", b"tr"),
+            (b"accept-encoding", b"gzip"),
+        ],
+        "client": (client, 1234),
+        "server": ("testserver", 443),
+    }
+    requested = False
+    done = asyncio.Event()
+
+    async def receive() -> dict[str, Any]:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"Unexpected response {message}")
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+
+
+async def timed(app: FastAPI, requests: int, clients: int) -> float:
+    # spread over clients so that the rate limiter allows every request
+    addresses = [f"10.0.{i // 256}.{i % 256}" for i in range(clients)]
+    await request(app, addresses[0])
+    started = time.perf_counter()
+    for i in range(requests):
+        await request(app, addresses[i % clients])
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+async def main(requests: int, clients: int) -> None:
+    # the production stack, with the rate limiter in process memory
+    settings.ENVIRONMENT = Environment.production
+    Cache.backend = MemoryBackend()
+    Cache.local = None
+
+    bare = await timed(make_app(False), requests, clients)
+    stack = await timed(make_app(True), requests, clients)
+    logger.info(f"{requests} requests")
+    logger.info(f"{'app':<16}{'us/request':>12}")
+    logger.info(f"{'bare':<16}{bare:>12.1f}")
+    logger.info(f"{'middlewares':<16}{stack:>12.1f}")
+    logger.info(f"{'overhead':<16}{stack - bare:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the per-request overhead of setup_middlewares"
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.clients))
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import logging
+import timeit
+from functools import partial
+from typing import Any
+
+from faker import Faker
+from redis import asyncio as aioredis
+
+from app.auth.schemas import UserRead
+from app.core.config import settings
+from app.core.serializers import CODECS, COMPRESSORS, Serializer, SerializerException
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+fake = Faker()
+
+
+def make_payloads(count: int) -> dict[str, Any]:
+    users = [
+        UserRead(
+            email=fake.email(),
+            full_name=fake.name(),
+            is_active=fake.pybool(),
+            is_superuser=fake.pybool(),
+            is_verified=fake.pybool(),
+        )
+        for _ in range(count)
+    ]
+    return {
+        "model": users[0],
+        "dict": users[0].dict(),
+        f"list[{count}]": [user.dict() for user in users],
+    }
+
+
+def make_serializers(threshold: int) -> dict[str, Serializer]:
+    serializers = {}
+    for codec in CODECS:
+        for compression in ("", *COMPRESSORS):
+            name = f"{codec}+{compression}" if compression else codec
+            try:
+                serializers[name] = Serializer(codec, compression, threshold)
+            except SerializerException as e:
+                logger.info(f"Skipping {name}: {e}")
+    return serializers
+
+
+async def memory_usage(
+    client: aioredis.Redis | None, key: str, data: bytes
+) -> int | None:
+    if client is None:
+        return None
+    try:
+        await client.set(key, data, ex=60)
+        return await client.memory_usage(key, samples=0)
+    except aioredis.RedisError:
+        return None
+
+
+async def main(count: int, number: int, threshold: int) -> None:
+    client = aioredis.from_url(settings.CACHE_URI) if settings.CACHE_URI else None
+    payloads = make_payloads(count)
+    serializers = make_serializers(threshold)
+
+    logger.info(
+        f"{'payload':<12}{'serializer':<16}{'bytes':>8}{'redis':>8}"
+        f"{'encode us':>12}{'decode us':>12}"
+    )
+    for payload_name, payload in payloads.items():
+        for name, serializer in serializers.items():
+            data = serializer.dumps(payload)
+            encode = timeit.timeit(partial(serializer.dumps, payload), number=number)
+            decode = timeit.timeit(partial(Serializer.loads, data), number=number)
+            redis_bytes = await memory_usage(client, f"benchmark:{name}", data)
+            logger.info(
+                f"{payload_name:<12}{name:<16}{len(data):>8}"
+                f"{redis_bytes if redis_bytes is not None else '-':>8}"
+                f"{encode / number * 1e6:>12.2f}{decode / number * 1e6:>12.2f}"
+            )
+
+    if client is not None:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cache serializers")
+    parser.add_argument("--count", type=int, default=100, help="users in list")
+    parser.add_argument("--number", type=int, default=2000, help="iterations")
+    parser.add_argument("--threshold", type=int, default=1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.number, args.threshold))
@@ -4,5 +4,6 @@ set -e
 aerich upgrade
 pybabel compile -d locale
 python /app/scripts/initial_data.py
+python /app/scripts/warm_cache.py
 
 exec gunicorn -k "uvicorn.workers.UvicornWorker" -c "/app/core/gunicorn_conf.py" "app.main:app"
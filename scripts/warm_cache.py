@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp
+
+from app.core.cache import Cache, cache_route
+from app.core.config import settings
+from app.main import app
+from app.middlewares import LocaleMiddleware
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def cached_routes(app: FastAPI) -> list[tuple[APIRoute, cache_route]]:
+    routes = []
+    for route in app.routes:
+        cached = getattr(getattr(route, "endpoint", None), "cache_route", None)
+        if not isinstance(route, APIRoute) or cached is None:
+            continue
+        if "GET" not in route.methods or not cached.warm:
+            continue
+        if route.param_convertors:
+            logger.info(f"Skipping {route.path}: it has path parameters")
+            continue
+        if cached.vary:
+            logger.info(f"Skipping {route.path}: it varies per request")
+            continue
+        routes.append((route, cached))
+    return routes
+
+
+def warming_app(app: FastAPI) -> ASGIApp:
+    """The app's routes behind the only middleware that cache keys depend on.
+
+    The full stack would count every request against the rate limit of
+    127.0.0.1 and redirect it when SERVER_URL is not https.
+    """
+    return LocaleMiddleware(app.router)
+
+
+async def request(
+    app: FastAPI, stack: ASGIApp, path: str, query: str, locale: str
+) -> int:
+    """Send a GET request through the ASGI stack and return the status code."""
+    url = settings.SERVER_URL
+    port = int(url.port or (443 if url.scheme == "https" else 80))
+    scope = {
+        "type": "http",
+        "app": app,
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": url.scheme,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", url.host.encode()),
+            (b"accept-language", locale.encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": (url.host, port),
+    }
+    status = 500
+    requested = False
+    done = asyncio.Event()
+
+    async def receive() -> dict[str, Any]:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await stack(scope, receive, send)
+    return status
+
+
+async def warm(
+    app: FastAPI, locales: list[str], concurrency: int, prefixes: list[str]
+) -> None:
+    routes = [
+        (route, cached)
+        for route, cached in cached_routes(app)
+        if not prefixes or route.path.startswith(tuple(prefixes))
+    ]
+    stack = warming_app(app)
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def replay(path: str, query: str, locale: str) -> None:
+        nonlocal failures
+        async with semaphore:
+            try:
+                status = await request(app, stack, path, query, locale)
+            except Exception:
+                logger.exception(f"Failed to warm {path}?{query} ({locale})")
+                status = 500
+        # anything else, a redirect included, left the cache cold
+        if not 200 <= status < 300:
+            failures += 1
+            logger.warning(f"Warming {path}?{query} ({locale}) returned {status}")
+
+    jobs = [
+        replay(route.path, query, locale)
+        for route, cached in routes
+        for query in cached.warm
+        for locale in locales
+    ]
+    writes = Cache.stats["writes"]
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    logger.info(
+        f"Warmed {len(routes)} routes with {len(jobs)} requests in "
+        f"{time.perf_counter() - started:.2f}s: "
+        f"{Cache.stats['writes'] - writes} keys filled, {failures} failed"
+    )
+
+
+async def main(locales: list[str], concurrency: int, prefixes: list[str]) -> None:
+    if settings.CACHE_BACKEND == "memory":
+        logger.info("Skipping cache warm-up, the memory backend is per process")
+        return
+
+    logger.info("Warming cache")
+    await app.router.startup()
+    try:
+        await warm(app, locales, concurrency, prefixes)
+    finally:
+        await app.router.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the cache of cached routes")
+    parser.add_argument(
+        "--locale",
+        action="append",
+        dest="locales",
+        help="locale to warm, repeatable (default: all)",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--route",
+        action="append",
+        dest="prefixes",
+        default=[],
+        help="only warm routes whose path starts with this, repeatable",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.locales or settings.LOCALES, args.concurrency, args.prefixes))